@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import json
+import fcntl
+import pickle
+import hashlib
+from contextlib import contextmanager
+
+# bump whenever the layout of a cached artifact changes
+CACHE_VERSION = 3
+
+TMP_SUFFIX = '.tmp'
+LOCK_SUFFIX = '.lock'
+PART_SUFFIX = '.part'
+
+
+def cache_key(network_topo, *params):
+    h = hashlib.sha256()
+    h.update(json.dumps(
+        [CACHE_VERSION, network_topo, [repr(p) for p in params]],
+        sort_keys=True
+    ).encode('utf-8'))
+    return h.hexdigest()
+
+
+def write_pickle(path, obj):
+    with open(path, 'wb') as f:
+        pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+
+
+def read_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def pickled(factory):
+    return lambda path: write_pickle(path, factory())
+
+
+# flock on path, held through an open handle; if evict unlinked the file
+# while we waited, it's opened again, so all holders share one lock file.
+# None when blocking is off and someone else holds it.
+def _acquire(path, blocking=True):
+    while True:
+        f = open(path, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        try:
+            current = os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            return f
+        f.close()
+
+
+def _release(f):
+    fcntl.flock(f, fcntl.LOCK_UN)
+    f.close()
+
+
+# Artifacts derived from a topology, stored as <directory>/<key>.<name>.
+# Builds and reads are serialized per artifact with a flock, so concurrent
+# controllers reuse each other's work instead of racing; finished files are
+# renamed into place and least recently used ones are evicted past
+# max_bytes, along with their lock files, but only if their lock is free.
+class ArtifactCache:
+    def __init__(self, directory='topocache', max_bytes=None):
+        self._dir = directory
+        self._max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, name):
+        return os.path.join(self._dir, f'{key}.{name}')
+
+    @contextmanager
+    def lock(self, key, name):
+        f = _acquire(self.path(key, name)+LOCK_SUFFIX)
+        try:
+            yield
+        finally:
+            _release(f)
+
+    # build(path) must leave the artifact at path; read(path) loads it
+    def get_or_build(self, key, name, build, read=read_pickle):
+        path = self.path(key, name)
+        with self.lock(key, name):
+            if os.path.isfile(path):
+                os.utime(path)
+            else:
+                tmp = path+TMP_SUFFIX
+                build(tmp)
+                os.replace(tmp, path)
+                self.evict(keep=path)
+            return read(path)
+
+    def entries(self):
+        for entry in os.scandir(self._dir):
+            if entry.is_file() and not entry.name.endswith((LOCK_SUFFIX, TMP_SUFFIX, PART_SUFFIX)):
+                yield entry
+
+    def evict(self, keep=None):
+        if self._max_bytes is None:
+            return
+        entries = list()
+        for entry in self.entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum([size for _, size, _ in entries])
+        for _, size, path in entries:
+            if total <= self._max_bytes:
+                break
+            if path == keep:
+                continue
+            # a busy artifact is being read or rebuilt; it stays
+            f = _acquire(path+LOCK_SUFFIX, blocking=False)
+            if f is None:
+                continue
+            try:
+                for victim in (path, path+LOCK_SUFFIX):
+                    try:
+                        os.unlink(victim)  # readers keep their open handles or maps
+                    except FileNotFoundError:
+                        pass
+            finally:
+                _release(f)
+            total -= size
+
+
+def artifact_cache_from_config(network_config):
+    return ArtifactCache(
+        network_config['cache']['directory'],
+        int(float(network_config['cache']['max_size_mb'])*2**20)
+    )
@@ -1,68 +1,564 @@
 #!/usr/bin/env python3
 # -*- encoding: utf-8 -*-
 
-EMPTY_ITER = iter(list())
+import math
+import heapq
+import random
+from array import array
+from collections import deque
 
 
-def _get_transition_map(graph):
-    transitions = [(source, target) for source, lnks in graph.items()
-                   for target in lnks.keys()]
-    transmap = dict()
-    for s, t in transitions:
-        if t not in transmap:
-            transmap[t] = list()
-        transmap[t].append(s)
-    return {k: tuple(v) for k, v in transmap.items()}
+class CompactGraph:
+    def __init__(self, names, indptr, indices, capacity, link_index, link_endpoints):
+        self._names = tuple(names)
+        self._index = {name: i for i, name in enumerate(self._names)}
+        self._indptr = indptr
+        self._indices = indices
+        self._capacity = capacity
+        self._link_index = link_index
+        self._link_endpoints = link_endpoints
+        self._adjacency = None
 
+    @classmethod
+    def from_topo(cls, network_topo):
+        hosts, switches, links = network_topo
+        return cls._from_links([*hosts, *switches], links)
 
-def _find_all_paths(tm, initial, target, accumulator=None):
-    if accumulator is None:
-        accumulator = list()
-    accumulator = [*accumulator, initial]
+    @classmethod
+    def from_graph(cls, graph):
+        links = list()
+        seen = set()
+        for source, lnks in graph.items():
+            for target, bandwidth in lnks.items():
+                if (target, source) not in seen:
+                    seen.add((source, target))
+                    links.append((source, target, bandwidth))
+        return cls._from_links(list(graph.keys()), links)
+
+    @classmethod
+    def coerce(cls, graph):
+        if isinstance(graph, cls):
+            return graph
+        return cls.from_graph(graph)
+
+    @classmethod
+    def _from_links(cls, names, links):
+        index = {name: i for i, name in enumerate(names)}
+        n = len(names)
+        degree = [0]*n
+        for l in links:
+            degree[index[l[0]]] += 1
+            degree[index[l[1]]] += 1
+        indptr = array('i', [0])*(n+1)
+        for i in range(n):
+            indptr[i+1] = indptr[i]+degree[i]
+        fill = list(indptr[:-1])
+        indices = array('i', [0])*indptr[n]
+        capacity = array('d', [0.0])*indptr[n]
+        link_index = array('i', [0])*indptr[n]
+        link_endpoints = array('i', [0])*(2*len(links))
+        for i, (u, v, bandwidth) in enumerate(links):
+            u, v = index[u], index[v]
+            bandwidth = math.inf if bandwidth is None else bandwidth
+            link_endpoints[2*i] = u
+            link_endpoints[2*i+1] = v
+            for a, b in ((u, v), (v, u)):
+                indices[fill[a]] = b
+                capacity[fill[a]] = bandwidth
+                link_index[fill[a]] = i
+                fill[a] += 1
+        return cls(names, indptr, indices, capacity, link_index, link_endpoints)
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def names(self):
+        return self._names
+
+    @property
+    def link_count(self):
+        return len(self._link_endpoints)//2
+
+    def index(self, name):
+        return self._index[name]
+
+    def name(self, node):
+        return self._names[node]
+
+    @property
+    def adjacency(self):
+        if self._adjacency is None:
+            self._adjacency = tuple(
+                tuple(self._indices[self._indptr[u]:self._indptr[u+1]])
+                for u in range(len(self._names))
+            )
+        return self._adjacency
+
+    def edges(self, node):
+        return range(self._indptr[node], self._indptr[node+1])
+
+    def edge_target(self, edge):
+        return self._indices[edge]
+
+    def edge_bandwidth(self, edge):
+        bandwidth = self._capacity[edge]
+        if bandwidth == math.inf:
+            return None
+        elif bandwidth.is_integer():
+            return int(bandwidth)
+        return bandwidth
+
+    def edge_link(self, edge):
+        return self._link_index[edge]
+
+    def find_edge(self, source, target):
+        for edge in self.edges(source):
+            if self._indices[edge] == target:
+                return edge
+        return None
+
+    def link_between(self, source, target):
+        edge = self.find_edge(self._index[source], self._index[target])
+        if edge is None:
+            return None
+        return self._link_index[edge]
+
+    def link_endpoints(self, link):
+        return (
+            self._names[self._link_endpoints[2*link]],
+            self._names[self._link_endpoints[2*link+1]]
+        )
+
+    def link_nodes(self, link):
+        return self._link_endpoints[2*link], self._link_endpoints[2*link+1]
+
+    def link_bandwidth(self, link):
+        u, v = self.link_nodes(link)
+        return self.edge_bandwidth(self.find_edge(u, v))
+
+    def to_topo(self):
+        links = list()
+        for link in range(self.link_count):
+            links.append((*self.link_endpoints(link), self.link_bandwidth(link)))
+        return [
+            [name for name in self._names if name.startswith('h')],
+            [name for name in self._names if not name.startswith('h')],
+            links
+        ]
+
+    def to_graph(self):
+        network_graph = dict()
+        for u, name in enumerate(self._names):
+            network_graph[name] = {
+                self._names[self._indices[edge]]: self.edge_bandwidth(edge)
+                for edge in self.edges(u)
+            }
+        return network_graph
+
+
+def _bfs_distances(adjacency, target):
+    distance = [-1]*len(adjacency)
+    distance[target] = 0
+    queue = deque([target])
+    while len(queue) > 0:
+        node = queue.popleft()
+        for nxt in adjacency[node]:
+            if distance[nxt] < 0:
+                distance[nxt] = distance[node]+1
+                queue.append(nxt)
+    return distance
+
+
+# depth-first with an explicit stack; a branch is dropped as soon as the
+# hops walked plus the BFS distance left to the target exceed the bound
+def _find_all_paths(adjacency, initial, target, max_stretch=None, max_paths=None):
+    distance = _bfs_distances(adjacency, target)
+    if distance[initial] < 0:
+        return
+    max_hops = _max_hops_for_stretch(distance[initial], max_stretch)
+    found = 0
+    path = [initial]
+    on_path = bytearray(len(adjacency))
+    on_path[initial] = 1
+    stack = [iter(adjacency[initial])]
+    while len(stack) > 0:
+        for nxt in stack[-1]:
+            if on_path[nxt] or distance[nxt] < 0:
+                continue
+            if max_hops is not None and len(path)+distance[nxt] > max_hops:
+                continue
+            if nxt == target:
+                yield tuple(path)+(nxt,)
+                found += 1
+                if max_paths is not None and found >= max_paths:
+                    return
+                continue
+            path.append(nxt)
+            on_path[nxt] = 1
+            stack.append(iter(adjacency[nxt]))
+            break
+        else:
+            stack.pop()
+            on_path[path.pop()] = 0
+
+
+def find_all_paths(graph, initial, target, accumulator=None, max_stretch=None, max_paths=None):
     if initial == target:
-        yield tuple(accumulator)
+        yield tuple([])
     else:
-        for intermediate in tm[initial]:
-            if intermediate not in accumulator:
-                yield from _find_all_paths(tm, intermediate, target, accumulator)
-        yield from EMPTY_ITER
+        cg = CompactGraph.coerce(graph)
+        names = cg.names
+        for path in _find_all_paths(cg.adjacency, cg.index(initial), cg.index(target), max_stretch, max_paths):
+            yield tuple(names[node] for node in path)
+
+
+def _bfs_path(adjacency, initial, target, banned_nodes=frozenset(), banned_edges=frozenset()):
+    parent = {initial: None}
+    queue = deque([initial])
+    while len(queue) > 0:
+        node = queue.popleft()
+        if node == target:
+            break
+        for nxt in adjacency[node]:
+            if (
+                nxt not in parent
+                and nxt not in banned_nodes
+                and (node, nxt) not in banned_edges
+            ):
+                parent[nxt] = node
+                queue.append(nxt)
+    if target not in parent:
+        return None
+    path = list()
+    current = target
+    while current is not None:
+        path.append(current)
+        current = parent[current]
+    return tuple(reversed(path))
 
 
-def find_all_paths(graph, initial, target, accumulator=None):
+def _max_hops_for_stretch(shortest, max_stretch):
+    if max_stretch is None:
+        return None
+    return int(math.floor(shortest*max_stretch + 1e-9))
+
+
+# Yen's algorithm: yields simple paths in non-decreasing hop count
+def _k_shortest_paths(adjacency, initial, target, k=None, max_stretch=None):
+    first = _bfs_path(adjacency, initial, target)
+    if first is None:
+        return
+    max_hops = _max_hops_for_stretch(len(first)-1, max_stretch)
+    accepted = [first]
+    yield first
+    candidates = list()
+    seen = {first}
+    while k is None or len(accepted) < k:
+        previous = accepted[-1]
+        for i in range(len(previous)-1):
+            root = previous[:i+1]
+            banned_edges = {
+                (path[i], path[i+1])
+                for path in accepted
+                if len(path) > i+1 and path[:i+1] == root
+            }
+            spur = _bfs_path(adjacency, previous[i], target,
+                             set(root[:-1]), banned_edges)
+            if spur is None:
+                continue
+            candidate = root[:-1]+spur
+            if candidate not in seen:
+                seen.add(candidate)
+                heapq.heappush(candidates, (len(candidate), candidate))
+        if len(candidates) <= 0:
+            break
+        length, path = heapq.heappop(candidates)
+        if max_hops is not None and length-1 > max_hops:
+            break
+        accepted.append(path)
+        yield path
+
+
+def k_shortest_paths(graph, initial, target, k=None, max_stretch=None):
     if initial == target:
         yield tuple([])
     else:
-        tm = _get_transition_map(graph)
-        yield from _find_all_paths(tm, initial, target)
+        cg = CompactGraph.coerce(graph)
+        names = cg.names
+        for path in _k_shortest_paths(cg.adjacency, cg.index(initial), cg.index(target), k, max_stretch):
+            yield tuple(names[node] for node in path)
+
+
+# counts[h][v]: walks from v that first reach target within h hops, each
+# hop scaled by decay. That's a DP over the layered (hops, node) DAG; walks
+# may revisit nodes, so with decay=1 it bounds the simple paths from above.
+def _walk_counts(adjacency, target, max_hops, decay=1):
+    counts = [[0]*len(adjacency)]
+    counts[0][target] = 1
+    for hops in range(1, max_hops+1):
+        previous = counts[-1]
+        current = [
+            decay*sum([previous[nxt] for nxt in adjacency[node]])
+            for node in range(len(adjacency))
+        ]
+        current[target] = 1
+        counts.append(current)
+    return counts
+
+
+def _hop_bound(adjacency, initial, target, max_stretch):
+    distance = _bfs_distances(adjacency, target)
+    if distance[initial] < 0:
+        return None
+    max_hops = _max_hops_for_stretch(distance[initial], max_stretch)
+    if max_hops is None:
+        max_hops = len(adjacency)-1
+    return max_hops
+
+
+def estimate_path_count(graph, initial, target, max_stretch=None):
+    if initial == target:
+        return 1
+    cg = CompactGraph.coerce(graph)
+    adjacency = cg.adjacency
+    initial, target = cg.index(initial), cg.index(target)
+    max_hops = _hop_bound(adjacency, initial, target, max_stretch)
+    if max_hops is None:
+        return 0
+    return _walk_counts(adjacency, target, max_hops)[max_hops][initial]
+
+
+# Random walks drawn from the decayed walk counts, so a path's chance falls
+# geometrically with its length; links already taken by earlier samples are
+# penalized, which spreads the set out. The shortest path always comes first.
+# When the walks keep repeating themselves, the shortfall is topped up from
+# Yen's enumeration, which also proves there are no more paths to find.
+def _sample_paths(adjacency, initial, target, k, max_hops, rng, shortness=0.5, reuse_penalty=0.25, attempts=None):
+    first = _bfs_path(adjacency, initial, target)
+    if first is None or k <= 0:
+        return []
+    weights = _walk_counts(adjacency, target, max_hops, shortness)
+    found = list()
+    seen = set()
+    used = dict()
+    candidate = first
+    for _ in range(attempts if attempts is not None else 8*k):
+        if candidate is not None and candidate not in seen:
+            seen.add(candidate)
+            found.append(candidate)
+            for u, v in zip(candidate, candidate[1:]):
+                used[(min(u, v), max(u, v))] = 1+used.get((min(u, v), max(u, v)), 0)
+        if len(found) >= k:
+            break
+        path = [initial]
+        node = initial
+        while node != target:
+            hops_left = max_hops-(len(path)-1)
+            if hops_left <= 0:
+                break
+            choices = [
+                (nxt, weights[hops_left-1][nxt] *
+                 reuse_penalty**used.get((min(node, nxt), max(node, nxt)), 0))
+                for nxt in adjacency[node]
+                if nxt not in path
+            ]
+            total = sum([weight for _, weight in choices])
+            if total <= 0:
+                break
+            pick = rng.random()*total
+            for nxt, weight in choices:
+                if weight <= 0:
+                    continue
+                chosen = nxt  # float leftovers fall on the last live choice
+                pick -= weight
+                if pick < 0:
+                    break
+            path.append(chosen)
+            node = chosen
+        candidate = tuple(path) if node == target else None
+    for path in _k_shortest_paths(adjacency, initial, target):
+        if len(found) >= k or len(path)-1 > max_hops:
+            break
+        if path not in seen:
+            seen.add(path)
+            found.append(path)
+    found.sort(key=lambda path: (len(path), path))
+    return found
 
 
-def dijkstra(graph, initial):
-    visited = {initial: 0}
-    path = dict()
+def sample_paths(graph, initial, target, k, max_stretch=None, shortness=0.5, reuse_penalty=0.25, seed=None):
+    if initial == target:
+        yield tuple([])
+    else:
+        cg = CompactGraph.coerce(graph)
+        adjacency = cg.adjacency
+        names = cg.names
+        u, v = cg.index(initial), cg.index(target)
+        max_hops = _hop_bound(adjacency, u, v, max_stretch)
+        if max_hops is not None:
+            for path in _sample_paths(adjacency, u, v, k, max_hops, random.Random(seed), shortness, reuse_penalty):
+                yield tuple(names[node] for node in path)
+
 
-    nodes = set(graph.keys())
-    mentions = {node: list(graph[node].keys()) for node in nodes}
+# unit-capacity max-flow over undirected links; augmenting along the
+# cheapest residual path (Bellman-Ford queue) so that, among the maximum
+# sets of edge-disjoint paths, the one with fewest total hops is found
+def _edge_disjoint_paths(adjacency, initial, target, allowed=None, share_endpoint_links=False):
+    endpoints = (initial, target)
+    flow = dict()
 
-    while len(nodes) > 0:
-        min_node = None
-        for node in nodes:
-            if node in visited:
-                if min_node is None:
-                    min_node = node
-                elif visited[node] < visited[min_node]:
-                    min_node = node
+    # a shared endpoint link can carry as many paths as its far side has
+    # links, which is never the bottleneck of the fabric behind it
+    def capacity(u, v):
+        if share_endpoint_links:
+            if u in endpoints and v not in endpoints:
+                return len(adjacency[v])
+            elif v in endpoints and u not in endpoints:
+                return len(adjacency[u])
+        return 1
 
-        if min_node is None:
+    while True:
+        distance = {initial: 0}
+        parent = {initial: None}
+        queue = deque([initial])
+        queued = {initial}
+        while len(queue) > 0:
+            u = queue.popleft()
+            queued.discard(u)
+            for v in adjacency[u]:
+                if allowed is not None and (u, v) not in allowed:
+                    continue
+                if flow.get((u, v), 0) >= capacity(u, v):
+                    continue
+                d = distance[u] + (-1 if flow.get((u, v), 0) < 0 else 1)
+                if v not in distance or d < distance[v]:
+                    distance[v] = d
+                    parent[v] = u
+                    if v not in queued:
+                        queued.add(v)
+                        queue.append(v)
+        if target not in parent:
             break
+        v = target
+        while parent[v] is not None:
+            u = parent[v]
+            flow[(u, v)] = flow.get((u, v), 0)+1
+            flow[(v, u)] = flow.get((v, u), 0)-1
+            v = u
+    outgoing = dict()
+    for (u, v), f in flow.items():
+        if f > 0:
+            outgoing.setdefault(u, list()).extend([v]*f)
+    paths = list()
+    while len(outgoing.get(initial, [])) > 0:
+        walk = [initial]
+        position = {initial: 0}
+        while walk[-1] != target:
+            v = outgoing[walk[-1]].pop()
+            if v in position:
+                for erased in walk[position[v]+1:]:
+                    del position[erased]
+                del walk[position[v]+1:]
+            else:
+                position[v] = len(walk)
+                walk.append(v)
+        paths.append(tuple(walk))
+    return sorted(set(paths), key=lambda a: (len(a), a))
+
+
+def edge_disjoint_paths(graph, initial, target, candidates=None, share_endpoint_links=False):
+    if initial == target:
+        return [tuple([])]
+    cg = CompactGraph.coerce(graph)
+    allowed = None
+    if candidates is not None:
+        allowed = set()
+        for path in candidates:
+            for i in range(len(path)-1):
+                u, v = cg.index(path[i]), cg.index(path[i+1])
+                allowed.add((u, v))
+                allowed.add((v, u))
+    names = cg.names
+    return [
+        tuple(names[node] for node in path)
+        for path in _edge_disjoint_paths(
+            cg.adjacency, cg.index(initial), cg.index(target), allowed,
+            share_endpoint_links)
+    ]
+
+
+def hop_cost(source, target, bandwidth):
+    return 1
+
+
+def inverse_bandwidth_cost(source, target, bandwidth):
+    if not bandwidth:
+        return 0  # unlimited bandwidth
+    return 1/bandwidth
+
+
+LINK_COSTS = {
+    'hops': hop_cost,
+    'bandwidth': inverse_bandwidth_cost,
+}
 
-        nodes.remove(min_node)
-        current_weight = visited[min_node]
 
-        for edge in mentions[min_node]:
-            weight = current_weight + 1
-            if edge not in visited or weight < visited[edge]:
-                visited[edge] = weight
-                path[edge] = min_node
+def _resolve_link_cost(weight):
+    if weight is None:
+        return hop_cost
+    elif callable(weight):
+        return weight
+    else:
+        return LINK_COSTS[weight]
+
+
+def _dijkstra(cg, source, cost):
+    names = cg.names
+    distance = [math.inf]*len(cg)
+    predecessor = [-1]*len(cg)
+    done = bytearray(len(cg))
+    distance[source] = 0
+    heap = [(0, source)]
+
+    while len(heap) > 0:
+        current_weight, min_node = heapq.heappop(heap)
+        if done[min_node]:
+            continue
+        done[min_node] = 1
+
+        for edge in cg.edges(min_node):
+            target = cg.edge_target(edge)
+            if cost is hop_cost:
+                weight = current_weight + 1
+            else:
+                weight = current_weight + cost(
+                    names[min_node],
+                    names[target],
+                    cg.edge_bandwidth(edge)
+                )
+            if weight < distance[target]:
+                distance[target] = weight
+                predecessor[target] = min_node
+                heapq.heappush(heap, (weight, target))
+    return distance, predecessor
+
+
+def dijkstra(graph, initial, weight=None):
+    cg = CompactGraph.coerce(graph)
+    names = cg.names
+    distance, predecessor = _dijkstra(
+        cg, cg.index(initial), _resolve_link_cost(weight))
+    visited = {
+        names[node]: d
+        for node, d in enumerate(distance)
+        if d != math.inf
+    }
+    path = {
+        names[node]: names[previous]
+        for node, previous in enumerate(predecessor)
+        if previous != -1
+    }
     return visited, path
 
 
@@ -79,13 +575,15 @@ def dijkstra_min_path(dijkstra_tuple, initial, target):
 
 
 class Dijkstra:
-    def __init__(self, graph):
-        self._graph = graph
+    def __init__(self, graph, weight=None):
+        self._graph = CompactGraph.coerce(graph)
+        self._weight = weight
         self._cache = dict()
 
     def __call__(self, initial):
         if initial not in self._cache:
-            self._cache[initial] = dijkstra(self._graph, initial)
+            self._cache[initial] = dijkstra(
+                self._graph, initial, self._weight)
         return DijkstraResults(initial, self._cache[initial])
 
 
@@ -98,6 +596,423 @@ class DijkstraResults:
         return dijkstra_min_path(self._dt, self._i, target)
 
 
+class AllPairsShortestPaths:
+    def __init__(self, graph, weight=None):
+        cg = CompactGraph.coerce(graph)
+        self._nodes = cg.names
+        self._index = {node: i for i, node in enumerate(self._nodes)}
+        n = len(self._nodes)
+        self._n = n
+        self._distance = array('d', [math.inf])*(n*n)
+        self._predecessor = array('i', [-1])*(n*n)
+        if weight is None:
+            for source in range(n):
+                self._bfs(cg.adjacency, source)
+        else:
+            cost = _resolve_link_cost(weight)
+            for source in range(n):
+                self._fill_from_dijkstra(source, _dijkstra(cg, source, cost))
+
+    def _bfs(self, adjacency, source):
+        offset = source*self._n
+        distance = self._distance
+        predecessor = self._predecessor
+        distance[offset+source] = 0
+        queue = deque([source])
+        while len(queue) > 0:
+            node = queue.popleft()
+            hops = distance[offset+node]+1
+            for nxt in adjacency[node]:
+                if distance[offset+nxt] == math.inf:
+                    distance[offset+nxt] = hops
+                    predecessor[offset+nxt] = node
+                    queue.append(nxt)
+
+    def _fill_from_dijkstra(self, source, dijkstra_arrays):
+        offset = source*self._n
+        distance, predecessor = dijkstra_arrays
+        self._distance[offset:offset+self._n] = array('d', distance)
+        self._predecessor[offset:offset+self._n] = array('i', predecessor)
+
+    @property
+    def nodes(self):
+        return tuple(self._nodes)
+
+    def distance(self, initial, target):
+        d = self._distance[self._index[initial]*self._n+self._index[target]]
+        return None if d == math.inf else d
+
+    def path(self, initial, target):
+        source = self._index[initial]
+        current = self._index[target]
+        offset = source*self._n
+        if self._distance[offset+current] == math.inf:
+            return []
+        min_path = list()
+        while current != -1:
+            min_path.append(self._nodes[current])
+            current = self._predecessor[offset+current]
+        return list(reversed(min_path))
+
+    def next_hop(self, initial, target):
+        source = self._index[initial]
+        current = self._index[target]
+        offset = source*self._n
+        if source == current or self._distance[offset+current] == math.inf:
+            return None
+        while self._predecessor[offset+current] != source:
+            current = self._predecessor[offset+current]
+        return self._nodes[current]
+
+    def __call__(self, initial):
+        return AllPairsShortestPathsResults(self, initial)
+
+
+class AllPairsShortestPathsResults:
+    def __init__(self, apsp, initial):
+        self._apsp = apsp
+        self._i = initial
+
+    def __call__(self, target):
+        min_path = self._apsp.path(self._i, target)
+        if len(min_path) <= 0:
+            return ([], None)
+        return (min_path, self._apsp.distance(self._i, target))
+
+
+# Bottleneck routing: a route's width is its narrowest link's bandwidth,
+# links without one being unlimited. 'widest' maximizes the width alone,
+# 'widest-shortest' picks the widest among the fewest-hop routes and
+# 'shortest-widest' the fewest-hop among the widest routes.
+BOTTLENECK_METRICS = ('widest', 'widest-shortest', 'shortest-widest')
+
+
+# label-setting towards root over (width, hops) labels, ordered width first
+# or hops first; both orders keep optimal labels settled in a tree
+def _bottleneck_tree(cg, root, hops_first):
+    width = [0.0]*len(cg)
+    hops = [math.inf]*len(cg)
+    parent = [-1]*len(cg)
+    done = bytearray(len(cg))
+    width[root] = math.inf
+    hops[root] = 0
+
+    def label(w, h):
+        return (h, -w) if hops_first else (-w, h)
+
+    heap = [(label(math.inf, 0), root)]
+    while len(heap) > 0:
+        _, node = heapq.heappop(heap)
+        if done[node]:
+            continue
+        done[node] = 1
+        for edge in cg.edges(node):
+            nxt = cg.edge_target(edge)
+            if done[nxt]:
+                continue
+            bandwidth = cg.edge_bandwidth(edge)
+            w = width[node] if bandwidth is None else min(width[node], bandwidth)
+            candidate = label(w, hops[node]+1)
+            if candidate < label(width[nxt], hops[nxt]):
+                width[nxt] = w
+                hops[nxt] = hops[node]+1
+                parent[nxt] = node
+                heapq.heappush(heap, (candidate, nxt))
+    return width, hops, parent
+
+
+# Shortest-widest routes don't nest into a tree, so they take two phases:
+# the widest tree gives each node's best width, then a BFS from root over
+# the links at least that wide gives its fewest-hop route of that width.
+# Nodes of equal width share one BFS tree, so routes come as a list of
+# parent trees plus each node's tree. A node's next hop is its parent in
+# its own tree: the hop reaches a node as wide and closer, or wider, so
+# hop-by-hop forwarding is loop-free, if not always along the source's
+# route.
+def _shortest_widest_routes(cg, root):
+    width, _, _ = _bottleneck_tree(cg, root, False)
+    reached = [node for node in range(len(cg)) if node != root and width[node] > 0]
+    hops = [math.inf]*len(cg)
+    hops[root] = 0
+    parent = [-1]*len(cg)
+    trees = list()
+    tree_of = [0]*len(cg)
+    for threshold in sorted({width[node] for node in reached}, reverse=True):
+        distance = {root: 0}
+        via = [-1]*len(cg)
+        queue = deque([root])
+        while len(queue) > 0:
+            node = queue.popleft()
+            for edge in cg.edges(node):
+                nxt = cg.edge_target(edge)
+                bandwidth = cg.edge_bandwidth(edge)
+                if nxt in distance or (bandwidth is not None and bandwidth < threshold):
+                    continue
+                distance[nxt] = distance[node]+1
+                via[nxt] = node
+                queue.append(nxt)
+        for node in reached:
+            if width[node] == threshold:
+                parent[node] = via[node]
+                hops[node] = distance[node]
+                tree_of[node] = len(trees)
+        trees.append(via)
+    return width, hops, parent, trees, tree_of
+
+
+# (width, hops, next hop, parent trees, each node's tree) towards root
+def _bottleneck_routes(cg, root, metric):
+    if metric in ('widest', 'widest-shortest'):
+        width, hops, parent = _bottleneck_tree(cg, root, metric == 'widest-shortest')
+        return width, hops, parent, [parent], [0]*len(cg)
+    elif metric == 'shortest-widest':
+        return _shortest_widest_routes(cg, root)
+    raise ValueError(f"Unknown bottleneck metric: {metric}")
+
+
+def _walk_tree(tree, node):
+    path = [node]
+    while tree[path[-1]] != -1:
+        path.append(tree[path[-1]])
+    return path
+
+
+def widest_path(graph, initial, target, metric='widest'):
+    cg = CompactGraph.coerce(graph)
+    names = cg.names
+    width, hops, _, trees, tree_of = _bottleneck_routes(cg, cg.index(target), metric)
+    current = cg.index(initial)
+    if hops[current] == math.inf:
+        return ([], None)
+    if current == cg.index(target):
+        return ([names[current]], width[current])
+    path = _walk_tree(trees[tree_of[current]], current)
+    return ([names[node] for node in path], width[current])
+
+
+# all-pairs bottleneck routes, kept by destination: row t holds each node's
+# next hop towards t, for forwarding, and its hops and width; its route is
+# walked through the parent tree it was found in, which for the tree
+# metrics is row t itself
+class AllPairsWidestPaths(AllPairsShortestPaths):
+    def __init__(self, graph, metric='widest'):
+        cg = CompactGraph.coerce(graph)
+        self._nodes = cg.names
+        self._index = {node: i for i, node in enumerate(self._nodes)}
+        n = len(self._nodes)
+        self._n = n
+        self._metric = metric
+        self._distance = array('d', [math.inf])*(n*n)
+        self._predecessor = array('i', [-1])*(n*n)
+        self._width = array('d', [0.0])*(n*n)
+        self._trees = list()
+        self._tree_of = array('i', [0])*(n*n)
+        for target in range(n):
+            width, hops, parent, trees, tree_of = _bottleneck_routes(cg, target, metric)
+            offset = target*n
+            self._distance[offset:offset+n] = array('d', hops)
+            self._predecessor[offset:offset+n] = array('i', parent)
+            self._width[offset:offset+n] = array('d', width)
+            self._trees.append([array('i', tree) for tree in trees])
+            self._tree_of[offset:offset+n] = array('i', tree_of)
+
+    @property
+    def metric(self):
+        return self._metric
+
+    def distance(self, initial, target):
+        d = self._distance[self._index[target]*self._n+self._index[initial]]
+        return None if d == math.inf else d
+
+    def width(self, initial, target):
+        offset = self._index[target]*self._n+self._index[initial]
+        if self._distance[offset] == math.inf:
+            return None
+        return self._width[offset]
+
+    def path(self, initial, target):
+        current = self._index[initial]
+        offset = self._index[target]*self._n
+        if self._distance[offset+current] == math.inf:
+            return []
+        if current == self._index[target]:
+            return [self._nodes[current]]
+        tree = self._trees[self._index[target]][self._tree_of[offset+current]]
+        return [self._nodes[node] for node in _walk_tree(tree, current)]
+
+    def next_hop(self, initial, target):
+        current = self._index[initial]
+        offset = self._index[target]*self._n
+        if self._predecessor[offset+current] == -1:
+            return None
+        return self._nodes[self._predecessor[offset+current]]
+
+
+ROUTE_METRICS = ('hops', *BOTTLENECK_METRICS)
+
+
+def all_pairs_routes(graph, metric='hops'):
+    if metric == 'hops':
+        return AllPairsShortestPaths(graph)
+    return AllPairsWidestPaths(graph, metric)
+
+
+# shortest-path trees kept up to date under link cost changes: a cost
+# increase on a tree link invalidates the subtree below it, which is
+# re-seeded from its intact neighbours; a decrease is pushed from the
+# cheaper endpoint; both are settled by one heap pass per source
+class DynamicShortestPaths:
+    def __init__(self, graph, sources=None, weights=None):
+        self._graph = CompactGraph.coerce(graph)
+        cg = self._graph
+        self._weight = array('d', [1.0])*cg.link_count
+        if weights is not None:
+            for link, weight in weights.items():
+                self._weight[self._link(link)] = weight
+        if sources is None:
+            sources = cg.names
+        self._distance = dict()
+        self._predecessor = dict()
+        self._children = dict()
+        for source in sources:
+            self._build(cg.index(source))
+
+    def _link(self, link):
+        if isinstance(link, int):
+            return link
+        return self._graph.link_between(*link)
+
+    def _build(self, source):
+        cg = self._graph
+        distance = [math.inf]*len(cg)
+        predecessor = [-1]*len(cg)
+        children = [set() for _ in range(len(cg))]
+        distance[source] = 0
+        self._distance[source] = distance
+        self._predecessor[source] = predecessor
+        self._children[source] = children
+        self._settle(source, [(0, source)])
+
+    def _settle(self, source, heap):
+        cg = self._graph
+        distance = self._distance[source]
+        predecessor = self._predecessor[source]
+        children = self._children[source]
+        weight = self._weight
+        touched = set()
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            d, node = heapq.heappop(heap)
+            if d > distance[node]:
+                continue
+            touched.add(node)
+            for edge in cg.edges(node):
+                target = cg.edge_target(edge)
+                nd = d + weight[cg.edge_link(edge)]
+                if nd < distance[target]:
+                    if predecessor[target] != -1:
+                        children[predecessor[target]].discard(target)
+                    distance[target] = nd
+                    predecessor[target] = node
+                    children[node].add(target)
+                    heapq.heappush(heap, (nd, target))
+        return touched
+
+    def _subtree(self, source, root):
+        children = self._children[source]
+        subtree = set()
+        stack = [root]
+        while len(stack) > 0:
+            node = stack.pop()
+            subtree.add(node)
+            stack.extend(children[node])
+        return subtree
+
+    def update(self, weights):
+        cg = self._graph
+        increased = list()
+        decreased = list()
+        for link, weight in weights.items():
+            link = self._link(link)
+            if weight > self._weight[link]:
+                increased.append(link)
+            elif weight < self._weight[link]:
+                decreased.append(link)
+            self._weight[link] = weight
+        if len(increased) <= 0 and len(decreased) <= 0:
+            return dict()
+        changed = dict()
+        for source in self._distance.keys():
+            changed[cg.name(source)] = {
+                cg.name(node)
+                for node in self._repair(source, increased, decreased)
+            }
+        return changed
+
+    def _repair(self, source, increased, decreased):
+        cg = self._graph
+        distance = self._distance[source]
+        predecessor = self._predecessor[source]
+        children = self._children[source]
+        affected = set()
+        for link in increased:
+            u, v = cg.link_nodes(link)
+            if predecessor[v] == u:
+                affected |= self._subtree(source, v)
+            elif predecessor[u] == v:
+                affected |= self._subtree(source, u)
+        for node in affected:
+            if predecessor[node] != -1:
+                children[predecessor[node]].discard(node)
+            predecessor[node] = -1
+            distance[node] = math.inf
+        heap = list()
+        for node in affected:
+            for edge in cg.edges(node):
+                neighbour = cg.edge_target(edge)
+                if neighbour in affected:
+                    continue
+                nd = distance[neighbour] + self._weight[cg.edge_link(edge)]
+                if nd < distance[node]:
+                    distance[node] = nd
+                    predecessor[node] = neighbour
+            if predecessor[node] != -1:
+                children[predecessor[node]].add(node)
+                heap.append((distance[node], node))
+        for link in decreased:
+            u, v = cg.link_nodes(link)
+            for a, b in ((u, v), (v, u)):
+                nd = distance[a] + self._weight[link]
+                if nd < distance[b]:
+                    if predecessor[b] != -1:
+                        children[predecessor[b]].discard(b)
+                    distance[b] = nd
+                    predecessor[b] = a
+                    children[a].add(b)
+                    heap.append((nd, b))
+        return affected | self._settle(source, heap)
+
+    def distance(self, initial, target):
+        cg = self._graph
+        d = self._distance[cg.index(initial)][cg.index(target)]
+        return None if d == math.inf else d
+
+    def path(self, initial, target):
+        cg = self._graph
+        predecessor = self._predecessor[cg.index(initial)]
+        current = cg.index(target)
+        if self._distance[cg.index(initial)][current] == math.inf:
+            return []
+        min_path = list()
+        while current != -1:
+            min_path.append(cg.name(current))
+            current = predecessor[current]
+        return list(reversed(min_path))
+
+    def __call__(self, initial):
+        return AllPairsShortestPathsResults(self, initial)
+
+
 def graph_from_topo(network_topo):
     network_graph = dict()
     for h in network_topo[0]:
@@ -108,3 +1023,7 @@ def graph_from_topo(network_topo):
         network_graph[l[0]][l[1]] = l[2]
         network_graph[l[1]][l[0]] = l[2]
     return network_graph
+
+
+def topo_from_graph(network_graph):
+    return CompactGraph.from_graph(network_graph).to_topo()
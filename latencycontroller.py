@@ -3,17 +3,18 @@
 
 import os
 import sys
-import json
 import pulp
 import numpy
 import random
 import datetime
 import threading
-from sortundirectednodepair import _sort_pair
-from graphtools import Dijkstra, find_all_paths, graph_from_topo
+from sortundirectednodepair import _sort_pair, interned_pair
+from graphtools import edge_disjoint_paths
+from topoapa import print_progress
+from topocontext import TopologyContext
+from artifactcache import artifact_cache_from_config
 from time import sleep
 from io import StringIO
-from id2ip import id2ip, ip2id
 from typing import Any
 from typing import Union
 from typing import Tuple
@@ -49,11 +50,6 @@ UNLIMITED_BANDWIDTH = 70*SPEED_TERABIT
 NoneType = type(None)
 
 print(f"loading network {sys.argv[2]}", file=sys.stderr)
-network_topo = ''
-with open(sys.argv[2]) as f:
-    network_topo = json.loads(f.read())
-# ryu uses eventlet, which, on some versions, breaks pathlib's read_text
-
 base_net_name = '.'.join(sys.argv[2].split('.')[:-1])
 
 with open('~current.state', 'w') as f:
@@ -75,74 +71,66 @@ m2 = float(network_config['linearalgconst']['m2'])
 hop_delay = float(network_config['linearalgconst']['hop_delay'])
 apa_path_stretch = float(network_config['APA']['path_stretch'])
 routing_algo = network_config['GENERAL']['algo']
+solve_edge_pairs = network_config['GENERAL'].get('granularity', 'host') == 'edge'
+
+topology = TopologyContext.load(
+    sys.argv[2],
+    network_config,
+    artifact_cache_from_config(network_config),
+    print_progress
+)
+
 
-network_graph = graph_from_topo(network_topo)
-
-
-def jsonload_list2tuple(x):
-    if isinstance(x, type(None)) or isinstance(x, int) or isinstance(x, float) or isinstance(x, str):
-        return x
-    elif isinstance(x, list) or isinstance(x, tuple):
-        return tuple([jsonload_list2tuple(k) for k in x])
-    elif isinstance(x, dict):
-        return {jsonload_list2tuple(k): jsonload_list2tuple(v) for k, v in x.items()}
-    else:
-        raise ValueError("Input didn't come from a standard JSON")
-
-
-def prepare_pop_pair_alternative_paths_for_availability(graph, hosts):
-    pop_apa = [[None for x in hosts] for y in hosts]
-    for i, h1 in enumerate(hosts):
-        for j, h2 in enumerate(hosts):
-            if pop_apa[i][j] is None:
-                apa = tuple(list(find_all_paths(graph, h1, h2)))
-                pop_apa[i][j] = apa
-                pop_apa[j][i] = apa
-    return pop_apa
-
-
-apacachefile = f"{base_net_name}.apa.json"
-print(
-    f"checking if APA for {sys.argv[2]} is cached at {apacachefile}", file=sys.stderr)
-
-pop_apa_candidates = None
-if os.path.isfile(apacachefile):
-    print(f"loading APA from {apacachefile}", file=sys.stderr)
-    with open(apacachefile) as f:
-        pop_apa_candidates = jsonload_list2tuple(json.loads(f.read()))
-else:
-    print(f"calculating APA for {sys.argv[2]}", file=sys.stderr)
-    pop_apa_candidates = prepare_pop_pair_alternative_paths_for_availability(
-        network_graph,
-        network_topo[0]
-    )
-    print(f"caching APA at {apacachefile}", file=sys.stderr)
-    with open(apacachefile, 'w') as f:
-        f.write(json.dumps(pop_apa_candidates))
+pop_disjoint_paths = dict()
 
 
 def filter_out_invalid_paths_from_multiple_paths(h1, h2, candidates, sw=None):
-    valid_paths = list()
-    valid_paths_bits_rev = set()
-    for path in sorted(
-        candidates,
-        key=lambda a: (len(a), a)
-    ):
-        if sw is not None and sw not in path:
-            continue
-        if path[0] == h2 and path[-1] == h1:
-            path = list(reversed(path))
-        path_bits = set([
-            tuple(path[i:i+2])
-            for i in range(len(path)-1)
-        ])
-        if len(path_bits.intersection(valid_paths_bits_rev)) <= 0:
-            valid_paths.append(path)
-            valid_paths_bits_rev = valid_paths_bits_rev.union(set([
-                tuple(reversed(i))
-                for i in path_bits
-            ]))
-    return valid_paths
+    if (h1, h2) not in pop_disjoint_paths:
+        valid_paths = edge_disjoint_paths(
+            topology.graph, h1, h2, candidates, share_endpoint_links=True)
+        pop_disjoint_paths[(h1, h2)] = valid_paths
+        pop_disjoint_paths[(h2, h1)] = [
+            tuple(reversed(path)) for path in valid_paths
+        ]
+    return [
+        path
+        for path in pop_disjoint_paths[(h1, h2)]
+        if sw is None or sw in path
+    ]
+
+
+# at edge granularity the evaluators only solve the representative pair of
+# each pair of edge switches, which is split back to host pairs on install
+def is_commodity(h1, h2):
+    return not solve_edge_pairs or topology.edge_pairs.is_representative(h1, h2)
+
+
+def split_route(path):
+    if not isinstance(path, WeightedPathAggregate):
+        return list(topology.edge_pairs.split(tuple(path)))
+    split = dict()
+    for seq, weight in path.items():
+        for pair, member_seq in topology.edge_pairs.split(seq):
+            split.setdefault(_sort_pair(*pair), dict())[member_seq] = weight
+    return [(pair, WeightedPathAggregate(weighted)) for pair, weighted in split.items()]
+
+
+def edge_pair_paths(path):
+    if not solve_edge_pairs:
+        return [path]
+    return [member_path for _, member_path in split_route(path)]
+
+
+def split_edge_pair_routes(processed: 'UsageStore') -> 'UsageStore':
+    routes = processed.copy()
+    if solve_edge_pairs:
+        for pair, path in processed._pairs.items():
+            if path is None or not topology.edge_pairs.is_representative(*pair):
+                continue
+            for member, member_path in split_route(path):
+                if not processed.contains(member):
+                    routes[member] = member_path
+    return routes
 
 
 class LatencyController:
@@ -150,12 +138,9 @@ class LatencyController:
         super().__init__()
         self._datapath = datapath
         self._sw = f"s{self._datapath.id}"
-        l = [
-            (i, x) for i, x in enumerate(network_topo[2])
-            if x[0] == self._sw or x[1] == self._sw
-        ]
+        l = topology.switch_links[self._sw]
         self._l = l
-        self._links = portno_from_list(l)
+        self._links = topology.ports[self._sw]
         self._flow_xfer = dict()
         self._flow_speed = dict()
         self._link_speed = UsageStoreProxyFromFlowDict(self._flow_speed)
@@ -167,9 +152,9 @@ class LatencyController:
         print(f"Switch connected: {self._sw}")
         print(f"Switch OSPF-fallback loading: {self._sw}")
         parser = self._datapath.ofproto_parser
-        self._ospf = la.ospf_dijkstra(self._sw)
-        for h in network_topo[0]:
-            ipv4_dst = id2ip(int(h[1:])-1)
+        self._ospf = la.ospf_dijkstra
+        for h in topology.hosts:
+            ipv4_dst = topology.host_ips[h]
             match_ipv4 = parser.OFPMatch(
                 eth_type=0x0800,
                 ipv4_dst=ipv4_dst
@@ -178,7 +163,7 @@ class LatencyController:
                 eth_type=0x0806,
                 arp_tpa=ipv4_dst
             )
-            next_hop = self._ospf(h)[0][1]
+            next_hop = self._ospf.next_hop(self._sw, h)
             out_port = self._links[(self._sw, next_hop)]
             actions = [parser.OFPActionOutput(out_port)]
             print(f"{self._sw} --[{out_port}]--> {next_hop} ({ipv4_dst})")
@@ -265,20 +250,18 @@ class LatencyController:
                 if stat.match['eth_type'] == 0x0800:
                     src = stat.match.get('ipv4_src', '10.0.0.0')
                     dst = stat.match['ipv4_dst']
-                    src = f"h{ip2id(src)+1}"
-                    dst = f"h{ip2id(dst)+1}"
-                    if src == 'h0':
-                        src = None
+                    src = topology.ip_hosts.get(src)
+                    dst = topology.ip_hosts.get(dst)
                     key = (src, self._sw, nxt, dst)
                     bc = stat.byte_count
                     obc = self._flow_xfer.get(key, 0)
                     tfd = max(0, bc-obc)*weight  # bytes per cycle
                     tfr = ((8*tfd)/la.interval)/10**6  # mbps
                     self._flow_xfer[key] = bc
-                    self._flow_speed[key] = tfr
+                    self._link_speed.set_flow(key, tfr)
                     allkeys.append(key)
         for k in (set(self._flow_speed.keys())-set(allkeys)):
-            self._flow_speed[k] = 0
+            self._link_speed.set_flow(k, 0)
 
     # with parts from <https://github.com/wildan2711/multipath/blob/master/ryu_multipath.py>
     # commented by <https://wildanmsyah.wordpress.com/2018/01/13/multipath-routing-with-load-balancing-using-ryu-openflow-controller/>
@@ -286,11 +269,11 @@ class LatencyController:
         ofproto = self._datapath.ofproto
         parser = self._datapath.ofproto_parser
         prints = list()
-        for h1p, h1 in enumerate(network_topo[0]):
-            for h2p, h2 in enumerate(network_topo[0]):
+        for h1p, h1 in enumerate(topology.hosts):
+            for h2p, h2 in enumerate(topology.hosts):
                 if h1p != h2p:
-                    ips = id2ip(int(h1[1:])-1)
-                    ipd = id2ip(int(h2[1:])-1)
+                    ips = topology.host_ips[h1]
+                    ipd = topology.host_ips[h2]
                     match = parser.OFPMatch(
                         eth_type=0x0800,
                         ipv4_src=ips,
@@ -299,7 +282,7 @@ class LatencyController:
                     valid_paths = filter_out_invalid_paths_from_multiple_paths(
                         h1,
                         h2,
-                        pop_apa_candidates[h1p][h2p],
+                        topology.apa[h1p][h2p],
                         self._sw
                     )
                     portouts = list()
@@ -324,7 +307,7 @@ class LatencyController:
                         # add simple rule
                     else:
                         all_bws = [x if x is not None else UNLIMITED_BANDWIDTH for x in [
-                            network_topo[2][portout-1][2] for portout in portouts]]
+                            topology.links[portout-1][2] for portout in portouts]]
                         sum_all_bws = sum(all_bws)
                         weighted_bws = [bw/sum_all_bws for bw in all_bws]
                         out_ports = list(zip(portouts, weighted_bws))
@@ -408,8 +391,8 @@ class LatencyController:
                 ipv4_src=ips,
                 ipv4_dst=ipd
             )
-            h1 = f"h{ip2id(ips)+1}"
-            h2 = f"h{ip2id(ipd)+1}"
+            h1 = topology.ip_hosts[ips]
+            h2 = topology.ip_hosts[ipd]
 
             out_ports = [
                 (self._links[(self._sw, nexthop)], weight)
@@ -453,84 +436,226 @@ class LatencyController:
 
     @property
     def simulatable(self):
-        return SimulatableSwitch(
-            self._sw,
-            self._flow_speed.copy(),
-            self._bandwidth.copy()
-        )
+        return SimulatableSwitch(self._sw, self._flow_speed.copy())
 
 
+# A switch's measured flows, as handed to SimulatableNetwork, which derives
+# every per-link figure from its own flow-rate matrix.
 class SimulatableSwitch:
-    def __init__(self, sw: str, fs: dict, bw: 'UsageStore'):
+    def __init__(self, sw: str, fs: dict):
         self._sw = sw
         self._flow_speed = fs
-        self._bandwidth = bw
-        self._link_speed = UsageStoreProxyFromFlowDict(self._flow_speed)
-        self._reinit()
-
-    def _reinit(self):
-        self._link_rules = self.get_link_rules()
-
-    def get_link_rules(self):
-        cnt = UsageStore()
-        for key, bw in self._flow_speed.items():
-            if bw > 0:
-                k = (key[1], key[2])
-                cnt[k] = 1+cnt[k]
-        return cnt
 
     @property
     def name(self):
         return self._sw
 
     def copy(self):
+        return type(self)(self._sw, self._flow_speed.copy())
+
+
+# Flows are numbered once for all simulated networks: a flow's key is its
+# (src, dst) pair id times directed_link_count plus its directed link id.
+# Link l is 2l from its first endpoint and 2l+1 from the second, and flows
+# matched on their destination alone have src None.
+flow_hosts = (*topology.hosts, None)
+flow_host_index = {h: i for i, h in enumerate(flow_hosts)}
+directed_link_count = 2*len(topology.links)
+directed_link_ids = {
+    endpoints: 2*link+direction
+    for link, (ne1, ne2, _) in enumerate(topology.links)
+    for direction, endpoints in enumerate(((ne1, ne2), (ne2, ne1)))
+}
+link_bandwidths = numpy.array([
+    UNLIMITED_BANDWIDTH if bw is None else bw
+    for _, _, bw in topology.links
+], dtype=numpy.float64)
+
+
+def flow_pair(src, dst):
+    return flow_host_index[src]*len(flow_hosts)+flow_host_index[dst]
+
+
+# -1 for flows no network can hold
+def flow_key(src, sw, nxt, dst):
+    dlink = directed_link_ids.get((sw, nxt))
+    if dlink is None or src not in flow_host_index or dst not in flow_host_index:
+        return -1
+    return flow_pair(src, dst)*directed_link_count+dlink
+
+
+_path_directed_links = dict()
+
+
+# directed link ids of a path's hops, memoized per path
+def path_directed_links(seq):
+    seq = tuple(seq)
+    if seq not in _path_directed_links:
+        _path_directed_links[seq] = numpy.array(
+            [directed_link_ids[hop] for hop in zip(seq, seq[1:])],
+            dtype=numpy.int64
+        )
+    return _path_directed_links[seq]
+
+
+# Sparse (pair, directed link) matrix of flow rates, as parallel arrays
+# sorted by flow key. Never changed in place: updates return new ones, so
+# networks can share them. Sorting by key keeps each pair's flows together;
+# pair_offsets indexes where they start, like a CSR row pointer.
+class FlowRates:
+    def __init__(self, keys=None, rates=None, pair_offsets=None):
+        self.keys = numpy.zeros(0, dtype=numpy.int64) if keys is None else keys
+        self.rates = numpy.zeros(0, dtype=numpy.float64) if rates is None else rates
+        self._pair_offsets = pair_offsets
+
+    @classmethod
+    def from_dict(cls, rates_by_key):
+        keys = numpy.fromiter(rates_by_key.keys(), dtype=numpy.int64, count=len(rates_by_key))
+        rates = numpy.fromiter(rates_by_key.values(), dtype=numpy.float64, count=len(rates_by_key))
+        order = numpy.argsort(keys)
+        return cls(keys[order], rates[order])
+
+    @classmethod
+    def from_flows(cls, flows):
+        rates_by_key = dict()
+        for flow, rate in flows:
+            key = flow_key(*flow)
+            if key >= 0:
+                rates_by_key[key] = rate
+        return cls.from_dict(rates_by_key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def pairs(self):
+        return self.keys // directed_link_count
+
+    @property
+    def links(self):
+        return (self.keys % directed_link_count) // 2
+
+    @property
+    def pair_offsets(self):
+        if self._pair_offsets is None:
+            self._pair_offsets = numpy.searchsorted(
+                self.keys,
+                numpy.arange(len(flow_hosts)**2+1, dtype=numpy.int64)*directed_link_count
+            )
+        return self._pair_offsets
+
+    # rates at the given keys, 0 for flows that aren't there
+    def lookup(self, keys):
+        keys = numpy.asarray(keys, dtype=numpy.int64)
+        if len(self.keys) <= 0:
+            return numpy.zeros(len(keys))
+        position = numpy.minimum(numpy.searchsorted(self.keys, keys), len(self.keys)-1)
+        return numpy.where(self.keys[position] == keys, self.rates[position], 0.0)
+
+    def with_rates(self, rates):
+        return type(self)(self.keys, rates, self._pair_offsets)
+
+    def without_pairs(self, pairs):
+        offsets = self.pair_offsets
+        keep = numpy.ones(len(self.keys), dtype=bool)
+        for pair in pairs:
+            keep[offsets[pair]:offsets[pair+1]] = False
+        return type(self)(self.keys[keep], self.rates[keep])
+
+    # positions of the given pairs' flows
+    def pair_entries(self, pairs):
+        offsets = self.pair_offsets
+        return numpy.array([
+            entry
+            for pair in pairs
+            for entry in range(offsets[pair], offsets[pair+1])
+        ], dtype=numpy.int64)
+
+    # these flows, overridden or extended by the other's
+    def merged(self, other):
+        keep = ~numpy.isin(self.keys, other.keys)
+        keys = numpy.concatenate([self.keys[keep], other.keys])
+        order = numpy.argsort(keys)
         return type(self)(
-            self._sw,
-            self._flow_speed.copy(),
-            self._bandwidth.copy()
+            keys[order],
+            numpy.concatenate([self.rates[keep], other.rates])[order]
         )
 
+    def updated(self, rates_by_key):
+        return self.merged(type(self).from_dict(rates_by_key))
+
 
+# A snapshot of the switches' flows the evaluators can alter. Per-link
+# speeds, loads and flow counts are reductions over the flow rates, and
+# copies share them until a change builds new ones.
 class SimulatableNetwork:
     def __init__(self, sws: List[SimulatableSwitch], paths: 'UsageStore'):
-        self.switches: Dict[str, SimulatableSwitch] = {
-            sw._sw: sw
-            for sw in sws
-        }
-        self.max_speed = bandwidth_from_list(enumerate(network_topo[2]))
+        self._init(
+            frozenset(sw.name for sw in sws),
+            FlowRates.from_flows(
+                (flow, rate)
+                for sw in sws
+                for flow, rate in sw._flow_speed.items()
+            ),
+            paths
+        )
+
+    def _init(self, switches: frozenset, flows: FlowRates, paths: 'UsageStore'):
+        self.switches = switches
+        self.flows = flows
         self.paths = paths
+        self._link_order = None
         self._reinit()
 
+    @property
+    def base(self) -> 'SimulatableNetwork':
+        return self
+
+    @property
+    def removed_pairs(self) -> frozenset:
+        return frozenset()
+
+    @property
+    def added_flows(self) -> Dict[int, Dict[int, float]]:
+        return dict()
+
+    def commit(self) -> 'SimulatableNetwork':
+        return self
+
+
+    # positions of a link's flows, in key order
+    def link_entries(self, link):
+        if self._link_order is None:
+            self._link_order = numpy.argsort(self.flows.links, kind='stable')
+            self._link_offsets = numpy.concatenate([
+                [0],
+                numpy.cumsum(numpy.bincount(self.flows.links, minlength=len(topology.links)))
+            ])
+        return self._link_order[self._link_offsets[link]:self._link_offsets[link+1]]
+
     def _reinit(self):
-        self._flow_speed = DictAggregator(
-            [sw._flow_speed for sw in self.switches.values()]
+        links = self.flows.links
+        rates = self.flows.rates
+        self.link_speeds = numpy.bincount(
+            links, weights=rates, minlength=len(topology.links))
+        self.link_loads = self.link_speeds / numpy.maximum(link_bandwidths, 0.0000000000001)
+        self.link_counts = numpy.bincount(
+            links[(rates > 0) & (link_bandwidths[links] > 0)],
+            minlength=len(topology.links)
         )
-        self.last_speed = UsageStoreProxyFromCallableIterable(
-            AttrCallableIterable(
-                AttrCallableIterable(
-                    self.switches.values,
-                    '_link_speed'
-                ),
-                'as_regular_storage'
-            ),
-            sum
-        ).as_regular_storage
-        self.link_usage = self.max_speed.calculate(
-            self.last_speed.as_regular_storage,
-            lambda maxspeed, lastspeed: (
-                lastspeed / max(maxspeed, 0.0000000000001)
-            )
-        ).as_regular_storage
+        self.link_usage = LinkUsageStore.from_values(self.link_loads.tolist())
         self.link_flows = self.get_link_flows()
 
+    def _derived(self, flows: FlowRates, paths: 'UsageStore') -> 'SimulatableNetwork':
+        net = object.__new__(type(self))
+        net._init(self.switches, flows, paths)
+        return net
+
     def get_link_flows(self):
-        cnt = UsageStore()
-        for switch in self.switches.values():
-            for (_, sw, nxt, __), speed in switch._flow_speed.items():
-                key = (sw, nxt)
-                if switch._bandwidth[key] > 0 and speed > 0:
-                    cnt[key] = 1+cnt[key]
-        return cnt
+        return LinkUsageStore.from_values([
+            count if count > 0 else None
+            for count in self.link_counts.tolist()
+        ])
 
     def get_routes(self):
         return self.paths.copy()
@@ -539,17 +664,17 @@ class SimulatableNetwork:
         return self.paths[(h1, h2)]
 
     def copy(self) -> 'SimulatableNetwork':
-        return type(self)(
-            [sw.copy() for sw in self.switches.values()],
-            self.paths.copy()
-        )
+        return self._derived(self.flows, self.paths.copy())
 
     def sort_by_max_flow_load(self, seqs):
+        seqs = [
+            seq if isinstance(seq, WeightedPathAggregate)
+            else WeightedPathAggregate({tuple(seq): 1.0})
+            for seq in seqs
+        ]
+        loads, _, _ = self.candidate_scores(seqs)
         wl = list()
-        for seq in seqs:
-            if not isinstance(seq, WeightedPathAggregate):
-                seq = WeightedPathAggregate({tuple(seq): 1.0})
-            ml = self.get_max_flow_load(seq)
+        for ml, seq in zip(loads.tolist(), seqs):
             wl.append((
                 ml,
                 sorted(seq.keys(), key=lambda a: len(a))[0],
@@ -560,120 +685,202 @@ class SimulatableNetwork:
             reversed(sorted(wl))
         ))
 
+    # Candidates as a sparse candidate x directed link incidence in COO
+    # form: one entry per hop of each path, with its candidate, the weight
+    # of its path and the pair of the candidate's sorted endpoints
+    def _incidence(self, wpas):
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        rows, pairs, dlinks, weights = [empty], [empty], [empty], [numpy.zeros(0)]
+        for row, wpa in enumerate(wpas):
+            h1, h2 = _sort_pair(wpa[0], wpa[-1])
+            pair = flow_pair(h1, h2)
+            if not isinstance(wpa, WeightedPathAggregate):
+                wpa = WeightedPathAggregate({tuple(wpa): 1.0})
+            for seq, weight in wpa.items():
+                if len(seq) < 2:
+                    continue
+                hops = path_directed_links(seq)
+                rows.append(numpy.full(len(hops), row, dtype=numpy.int64))
+                pairs.append(numpy.full(len(hops), pair, dtype=numpy.int64))
+                dlinks.append(hops)
+                weights.append(numpy.full(len(hops), weight, dtype=numpy.float64))
+        return tuple(map(numpy.concatenate, (rows, pairs, dlinks, weights)))
+
+    # rates of the flows of the given pairs over the given directed links
+    def _flow_rates(self, pairs, dlinks):
+        return self.flows.lookup(pairs*directed_link_count+dlinks)
+
+    # Max flow load, max flow speed and max path load of each candidate,
+    # reduced over its incidence entries. A hop's flows are the sorted
+    # pair's along it and the reversed pair's back.
+    def candidate_scores(self, wpas):
+        rows, pairs, dlinks, weights = self._incidence(wpas)
+        hosts = len(flow_hosts)
+        forward = self._flow_rates(pairs, dlinks)
+        backward = self._flow_rates((pairs % hosts)*hosts+pairs//hosts, dlinks ^ 1)
+        links = dlinks // 2
+        bandwidths = link_bandwidths[links]
+        flow_loads = numpy.zeros(len(wpas))
+        numpy.fmax.at(flow_loads, rows, ((forward/bandwidths)+(backward/bandwidths))*weights)
+        flow_speeds = numpy.zeros(len(wpas))
+        numpy.fmax.at(flow_speeds, rows, (forward+backward)*weights)
+        path_loads = numpy.zeros(len(wpas))
+        numpy.fmax.at(path_loads, rows, self.link_loads[links])
+        return flow_loads, flow_speeds, path_loads
+
     def get_max_flow_load(self, wpa):
-        h1, h2 = _sort_pair(wpa[0], wpa[-1])
-        ml = 0
-        if not isinstance(wpa, WeightedPathAggregate):
-            wpa = WeightedPathAggregate({tuple(wpa): 1.0})
-        for seq, weight in wpa.items():
-            for i in range(len(seq)-1):
-                link = tuple(seq[i:i+2])
-                revlink = tuple(list(reversed(link)))
-                ml = max(
-                    ml,
-                    ((
-                        (
-                            self._flow_speed.get(tuple([h1, *link, h2]), 0)
-                            /
-                            self.max_speed[link]
-                        )+(
-                            self._flow_speed.get(tuple([h2, *revlink, h1]), 0)
-                            /
-                            self.max_speed[revlink]
-                        )
-                    ))*weight
-                )
-        return ml
+        return float(self.candidate_scores([wpa])[0][0])
 
     def get_max_flow_speed(self, wpa):
-        h1, h2 = _sort_pair(wpa[0], wpa[-1])
-        if not isinstance(wpa, WeightedPathAggregate):
-            wpa = WeightedPathAggregate({tuple(wpa): 1.0})
-        ml = 0
-        for seq, weight in wpa.items():
-            for i in range(len(seq)-1):
-                link = tuple(seq[i:i+2])
-                revlink = tuple(list(reversed(link)))
-                ml = max(
-                    ml,
-                    ((
-                        self._flow_speed.get(tuple([h1, *link, h2]), 0)
-                        +
-                        self._flow_speed.get(tuple([h2, *revlink, h1]), 0)
-                    ))*weight
-                )
-        return ml
+        return float(self.candidate_scores([wpa])[1][0])
 
     def get_max_path_load(self, wpa):
-        ml = 0
-        if not isinstance(wpa, WeightedPathAggregate):
-            wpa = WeightedPathAggregate({tuple(wpa): 1.0})
-        for seq in wpa.keys():
-            for i in range(len(seq)-1):
-                link = tuple(seq[i:i+2])
-                ml = max(
-                    ml,
-                    self.link_usage[link]
-                )
-        return ml
+        return float(self.candidate_scores([wpa])[2][0])
 
     def with_modified_path(self, newpath):
-        mod = self.copy()
-        oldpath = self.get_path(newpath[0], newpath[-1])
-        flowspeed = self.get_max_flow_speed(oldpath)
-        # removing old flows
-        for sw in mod.switches.values():
-            for k in sw._flow_speed.copy().keys():
-                if (
-                    k[0] in [newpath[0], newpath[-1]]
-                    and
-                    k[3] in [newpath[0], newpath[-1]]
-                ):
-                    del sw._flow_speed[k]
-        # adding new flows
-        if not isinstance(newpath, WeightedPathAggregate):
-            newpath = WeightedPathAggregate({tuple(newpath): 1.0})
-        for newpath2, weight in newpath.items():
-            for i in range(1, len(newpath2)-1):
-                ky = newpath2[0], newpath2[i], newpath2[i+1], newpath2[-1]
-                rk = newpath2[-1], newpath2[i-1], newpath2[i], newpath2[0]
-                if ky[1].startswith('s') and ky[1] in mod.switches:
-                    mod.switches[ky[1]]._flow_speed[ky] = (weight*flowspeed)/2
-                if rk[1].startswith('s') and rk[1] in mod.switches:
-                    mod.switches[rk[1]]._flow_speed[rk] = (weight*flowspeed)/2
-        for sw in mod.switches.values():
-            sw._reinit()
-        self.paths[tuple([newpath[0], newpath[-1]])] = newpath
-        mod._reinit()
-        return mod
+        return self.with_modified_paths([newpath])
+
+    # the result only records the rerouted pairs' flows over this network
+    def with_modified_paths(self, newpaths):
+        paths = self.paths.copy()
+        removed = set()
+        added = dict()
+        for newpath in newpaths:
+            oldpath = self.get_path(newpath[0], newpath[-1])
+            flowspeed = self.get_max_flow_speed(oldpath)
+            # removing old flows
+            ends = [newpath[0], newpath[-1]]
+            pairs = {flow_pair(src, dst) for src in ends for dst in ends}
+            removed |= pairs
+            for pair in pairs:
+                added.pop(pair, None)
+            # adding new flows
+            if not isinstance(newpath, WeightedPathAggregate):
+                newpath = WeightedPathAggregate({tuple(newpath): 1.0})
+            for newpath2, weight in newpath.items():
+                dlinks = path_directed_links(newpath2).tolist()
+                forward = added.setdefault(flow_pair(newpath2[0], newpath2[-1]), dict())
+                backward = added.setdefault(flow_pair(newpath2[-1], newpath2[0]), dict())
+                for i in range(1, len(newpath2)-1):
+                    if newpath2[i].startswith('s') and newpath2[i] in self.switches:
+                        forward[dlinks[i]] = (weight*flowspeed)/2
+                    if newpath2[i-1].startswith('s') and newpath2[i-1] in self.switches:
+                        backward[dlinks[i-1]] = (weight*flowspeed)/2
+            self.paths[tuple([newpath[0], newpath[-1]])] = newpath
+        return SimulatableNetworkOverlay(self, removed, added, paths)
 
     def copy_normalized(self):
         net = self.copy()
         for path in net.get_routes()._pairs.values():
             net = net.with_modified_path(path)
-        return net
+        return net.commit()
 
     # Gvozdiev et al @ SIGCOMM2018, p. 94 => Algorithm 1
-    def copy_scaling(self, prev_prediction: Dict[Tuple[str], float], fixed_hedge: float, decay_multiplier: float) -> Tuple['SimulatableNetwork', Dict[Tuple[str], float]]:
+    def copy_scaling(self, prev_prediction: Optional[FlowRates], fixed_hedge: float, decay_multiplier: float) -> Tuple['SimulatableNetwork', FlowRates]:
         if prev_prediction is None:
-            prev_prediction = dict()
-        net = self.copy()
-        next_prediction = dict()
-        for sw in net.switches.values():
-            for idtf, prev_value in sw._flow_speed.items():
-                scaled_est = prev_value*fixed_hedge
-                if scaled_est > prev_prediction.get(idtf, 0):
-                    next_prediction[idtf] = scaled_est
-                else:
-                    decay_prediction = prev_prediction.get(
-                        idtf, 0) * decay_multiplier
-                    next_prediction[idtf] = max(decay_prediction, scaled_est)
-        for sw in net.switches.values():
-            for idtf in sw._flow_speed.keys():
-                sw._flow_speed[idtf] = next_prediction[idtf]
-            sw._reinit()
-        net._reinit()
-        return net, next_prediction
+            prev_prediction = FlowRates()
+        net = self.commit()
+        scaled_est = net.flows.rates*fixed_hedge
+        prev_value = prev_prediction.lookup(net.flows.keys)
+        next_prediction = net.flows.with_rates(numpy.where(
+            scaled_est > prev_value,
+            scaled_est,
+            numpy.maximum(prev_value*decay_multiplier, scaled_est)
+        ))
+        return net._derived(next_prediction, self.paths.copy()), next_prediction
+
+
+# Copy-on-write network: a committed base plus the pairs rerouted since,
+# whose flows, by pair and directed link, replace the base's. Link totals
+# start as the parent's and
+# only the links those flows cross are summed again, over the merged flows
+# in key order, so they match what committing would compute. Discarding an
+# overlay is dropping it; commit() folds it into a plain network.
+class SimulatableNetworkOverlay(SimulatableNetwork):
+    def __init__(self, parent: SimulatableNetwork, removed: set, added: Dict[int, Dict[int, float]], paths: 'UsageStore'):
+        base = parent.base
+        self._base = base
+        self.switches = base.switches
+        self.paths = paths
+        affected = set(base.flows.links[base.flows.pair_entries(removed)].tolist())
+        for pair in removed:
+            for flows in (parent.added_flows.get(pair, dict()), added.get(pair, dict())):
+                affected.update(dlink//2 for dlink in flows.keys())
+        self._removed = parent.removed_pairs | frozenset(removed)
+        self._added = {
+            pair: flows
+            for pair, flows in parent.added_flows.items()
+            if pair not in removed
+        }
+        self._added.update(added)
+        self._added_by_link = dict()
+        for pair, flows in self._added.items():
+            for dlink, rate in flows.items():
+                self._added_by_link.setdefault(dlink//2, list()).append(
+                    (pair*directed_link_count+dlink, rate))
+        self.link_speeds = parent.link_speeds.copy()
+        self.link_loads = parent.link_loads.copy()
+        self.link_counts = parent.link_counts.copy()
+        self.link_usage = parent.link_usage.copy()
+        self.link_flows = parent.link_flows.copy()
+        for link in affected:
+            self._resum(link)
+
+    def _resum(self, link):
+        base = self._base
+        entries = base.link_entries(link)
+        flows = [
+            (key, rate)
+            for key, rate in zip(base.flows.keys[entries].tolist(), base.flows.rates[entries].tolist())
+            if key // directed_link_count not in self._removed
+        ]
+        flows.extend(self._added_by_link.get(link, list()))
+        flows.sort()
+        speed = sum([rate for _, rate in flows])
+        bandwidth = float(link_bandwidths[link])
+        load = speed / max(bandwidth, 0.0000000000001)
+        count = len([rate for _, rate in flows if rate > 0]) if bandwidth > 0 else 0
+        self.link_speeds[link] = speed
+        self.link_loads[link] = load
+        self.link_counts[link] = count
+        self.link_usage[topology.link_keys[link]] = load
+        if count > 0:
+            self.link_flows[topology.link_keys[link]] = count
+        else:
+            self.link_flows.discard(topology.link_keys[link])
+
+    @property
+    def base(self) -> SimulatableNetwork:
+        return self._base
+
+    @property
+    def removed_pairs(self) -> frozenset:
+        return self._removed
+
+    @property
+    def added_flows(self) -> Dict[int, Dict[int, float]]:
+        return self._added
+
+    def commit(self) -> SimulatableNetwork:
+        flows = self._base.flows.without_pairs(self._removed).updated({
+            pair*directed_link_count+dlink: rate
+            for pair, flows in self._added.items()
+            for dlink, rate in flows.items()
+        })
+        return self._base._derived(flows, self.paths.copy())
+
+    def _flow_rates(self, pairs, dlinks):
+        rates = self._base.flows.lookup(pairs*directed_link_count+dlinks)
+        if len(self._removed) > 0:
+            for i in numpy.flatnonzero(numpy.isin(pairs, list(self._removed))).tolist():
+                rates[i] = self._added.get(int(pairs[i]), dict()).get(int(dlinks[i]), 0.0)
+        return rates
+
+    def get_link_flows(self):
+        return self.link_flows.copy()
+
+    def copy(self) -> 'SimulatableNetworkOverlay':
+        return type(self)(self, set(), dict(), self.paths.copy())
 
 
 class AbstractPathEvaluator:
@@ -721,7 +928,7 @@ class LDRSinglePathEvaluator(AbstractPathEvaluator):
                     break
             if most_loaded is None:
                 break
-            newnet = net.with_modified_path(most_loaded)
+            newnet = net.with_modified_paths(edge_pair_paths(most_loaded))
             old_path_for_most_loaded = net.get_path(
                 most_loaded[0], most_loaded[-1])
             if (
@@ -729,23 +936,23 @@ class LDRSinglePathEvaluator(AbstractPathEvaluator):
                 <=
                 net.get_max_path_load(old_path_for_most_loaded)
             ):
-                net = newnet
+                net = newnet.commit()
             changed[(most_loaded[0], most_loaded[-1])] = most_loaded
         return net.get_routes()
 
     def _figure12(self, link_usage, link_flows) -> 'UsageStore':
         processed = UsageStore()
-        currently_reserved = UsageStore()
-        ospf = Dijkstra(network_graph)
-        l1 = network_topo[0][:]
+        currently_reserved = LinkUsageStore()
+        ospf = topology.ospf_routes
+        l1 = list(topology.hosts)
         random.shuffle(l1)
         for h1 in l1:
-            l2 = network_topo[0][:]
+            l2 = list(topology.hosts)
             random.shuffle(l2)
             for h2 in l2:
-                if h1 != h2 and not processed.contains((h1, h2)):
-                    h1p = network_topo[0].index(h1)
-                    h2p = network_topo[0].index(h2)
+                if h1 != h2 and not processed.contains((h1, h2)) and is_commodity(h1, h2):
+                    h1p = topology.host_index[h1]
+                    h2p = topology.host_index[h2]
                     ospf_aggregate = ospf(h1)(h2)[0]
                     ospf_delay = sum([
                         link_usage[
@@ -753,7 +960,7 @@ class LDRSinglePathEvaluator(AbstractPathEvaluator):
                         ] + hop_delay
                         for i in range(len(ospf_aggregate)-1)
                     ])
-                    aggregates = list(pop_apa_candidates[h1p][h2p])
+                    aggregates = list(topology.candidates(h1p, h2p))
                     random.shuffle(aggregates)
                     del h1p
                     del h2p
@@ -763,11 +970,8 @@ class LDRSinglePathEvaluator(AbstractPathEvaluator):
                     nalist = list()
                     na = 0  # flows in aggregate
                     omax = 0  # maximum overload
-                    for aggregate in aggregates:
-                        links = [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
+                    for aggregate, link_ids in aggregates:
+                        links = [topology.link_keys[link] for link in link_ids]
                         omax2 = 0
                         for link in links:
                             omax2 = max(omax2, link_usage[link])
@@ -780,10 +984,6 @@ class LDRSinglePathEvaluator(AbstractPathEvaluator):
                             omax = omax2
                     # del nalist
                     # for aggregate in aggregates:
-                        links = [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
                         eps2 = 0
                         xap = 1
                         for link in links:
@@ -831,7 +1031,7 @@ class LDRPathEvaluator(AbstractPathEvaluator):
                     break
             if most_loaded is None:
                 break
-            newnet = net.with_modified_path(most_loaded)
+            newnet = net.with_modified_paths(edge_pair_paths(most_loaded))
             old_path_for_most_loaded = net.get_path(
                 most_loaded[0], most_loaded[-1])
             if (
@@ -839,30 +1039,30 @@ class LDRPathEvaluator(AbstractPathEvaluator):
                 <=
                 net.get_max_path_load(old_path_for_most_loaded)
             ):
-                net = newnet
+                net = newnet.commit()
             changed[(most_loaded[0], most_loaded[-1])] = most_loaded
         return net.get_routes()
 
     def _figure12(self, net: SimulatableNetwork) -> 'UsageStore':
         link_usage = net.link_usage
         link_flows = net.link_flows
-        ospf = Dijkstra(network_graph)
+        ospf = topology.ospf_routes
         opt_model = pulp.LpProblem("LDR", pulp.LpMinimize)
         xap = pulp.LpVariable("xa", 0, 1)
         processed = UsageStore(default=dict())
-        l1 = network_topo[0][:]
+        l1 = list(topology.hosts)
         random.shuffle(l1)
         sumaggregates = 0
         for h1 in l1:
-            l2 = network_topo[0][:]
+            l2 = list(topology.hosts)
             random.shuffle(l2)
             for h2 in l2:
-                if h1 != h2 and not processed.contains((h1, h2)):
+                if h1 != h2 and not processed.contains((h1, h2)) and is_commodity(h1, h2):
                     h1, h2 = _sort_pair(h1, h2)
                     opt_vars = dict()
                     processed[(h1, h2)] = opt_vars
-                    h1p = network_topo[0].index(h1)
-                    h2p = network_topo[0].index(h2)
+                    h1p = topology.host_index[h1]
+                    h2p = topology.host_index[h2]
                     ospf_aggregate = ospf(h1)(h2)[0]
                     ospf_delay = sum([
                         link_usage[
@@ -870,33 +1070,23 @@ class LDRPathEvaluator(AbstractPathEvaluator):
                         ] + hop_delay
                         for i in range(len(ospf_aggregate)-1)
                     ])
-                    aggregates = list(pop_apa_candidates[h1p][h2p])[:]
-                    for aggregate in aggregates[:]:
-                        links = [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
+                    aggregates = list()
+                    for aggregate, link_ids in topology.candidates(h1p, h2p):
+                        links = [topology.link_keys[link] for link in link_ids]
                         dp = sum(
                             [link_usage[link]+hop_delay for link in links])
-                        if (ospf_delay == 0) or ((dp/ospf_delay) > apa_path_stretch):
-                            del aggregates[aggregates.index(aggregate)]
+                        if not ((ospf_delay == 0) or ((dp/ospf_delay) > apa_path_stretch)):
+                            aggregates.append((aggregate, links))
                     random.shuffle(aggregates)
                     sumpinpa = 0
                     sumxappinpa = 0
                     na = sum([
                         link_flows[link]
-                        for aggregate in aggregates
-                        for link in [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
+                        for aggregate, links in aggregates
+                        for link in links
                     ])
                     na = max(na, MIN_POSITIVE_FLOAT)
-                    for aggregate in aggregates:
-                        links = [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
+                    for aggregate, links in aggregates:
                         xap = pulp.LpVariable(
                             f"xap_{h1}_{h2}__{'_'.join(aggregate)}", 0, 1)
                         opt_vars[tuple(aggregate)] = xap
@@ -942,23 +1132,22 @@ class MinMaxSinglePathEvaluator(AbstractPathEvaluator):
     def minmax(self, net: SimulatableNetwork) -> 'UsageStore':
         net = net.copy_normalized()
         processed = UsageStore()
-        l1 = network_topo[0][:]
+        l1 = list(topology.hosts)
         random.shuffle(l1)
         for h1 in l1:
-            l2 = network_topo[0][:]
+            l2 = list(topology.hosts)
             random.shuffle(l2)
             for h2 in l2:
-                if h1 != h2 and not processed.contains((h1, h2)):
-                    h1p = network_topo[0].index(h1)
-                    h2p = network_topo[0].index(h2)
-                    aggregates = list(pop_apa_candidates[h1p][h2p])
+                if h1 != h2 and not processed.contains((h1, h2)) and is_commodity(h1, h2):
+                    h1p = topology.host_index[h1]
+                    h2p = topology.host_index[h2]
+                    aggregates = [
+                        aggregate
+                        for aggregate, _ in topology.candidates(h1p, h2p)
+                    ]
                     configurations = list()
                     for aggregate in aggregates:
-                        links = [
-                            _sort_pair(*aggregate[i:i+2])
-                            for i in range(len(aggregate)-1)
-                        ]
-                        newnet = net.with_modified_path(aggregate)
+                        newnet = net.with_modified_paths(edge_pair_paths(aggregate))
                         configurations.append((
                             newnet.get_max_path_load(aggregate),
                             len(aggregate),
@@ -968,7 +1157,7 @@ class MinMaxSinglePathEvaluator(AbstractPathEvaluator):
                     configurations.sort()
                     configuration = configurations[0]
                     processed[(h1, h2)] = configuration[2]
-                    net = configuration[3]
+                    net = configuration[3].commit()
         return processed
 
 
@@ -994,24 +1183,18 @@ class LatencyApp(app_manager.RyuApp):
         super().__init__(*args, **kwargs)
         self.mac_to_port = {}
         self.controllers = {}
-        self._paths = host_path_from_list(network_topo[0])
+        self._paths = host_path_from_list(topology.hosts)
         self._loads = usage_store_from_list(enumerate([]))
-        self.max_speed = bandwidth_from_list(enumerate(network_topo[2]))
+        self.max_speed = bandwidth_from_list(enumerate(topology.links))
         self.last_speed = UsageStoreProxyFromCallableIterable(
-            AttrCallableIterable(
-                AttrCallableIterable(
-                    self.controllers.values,
-                    '_link_speed'
-                ),
-                'as_regular_storage'
-            ),
+            AttrCallableIterable(self.controllers.values, '_link_speed'),
             sum
         )
         self.flow_count = UsageStoreProxyFromCallableIterable(
             AttrCallableIterable(self.controllers.values, '_link_rules'),
             sum
         )
-        self.ospf_dijkstra = Dijkstra(network_graph)
+        self.ospf_dijkstra = topology.ospf_routes
         self.ecmp_group_ids = dict()
         self.ecmp_group_id_buckets = dict()
         self._last_process_data = None
@@ -1094,10 +1277,10 @@ class LatencyApp(app_manager.RyuApp):
 
     def _update_topo_done_successfully(self, processed):
         print(f'-> Topo updated {datetime.datetime.now()}')
-        for (h1, h2), path in processed._pairs.items():
+        for (h1, h2), path in split_edge_pair_routes(processed)._pairs.items():
             self._paths[(h1, h2)] = path
-            ip1 = id2ip(int(h1[1:])-1)
-            ip2 = id2ip(int(h2[1:])-1)
+            ip1 = topology.host_ips[h1]
+            ip2 = topology.host_ips[h2]
             if isinstance(path, WeightedPathAggregate):
                 for src, weighted_destinations in path.transitions(h1).items():
                     if src.startswith('s'):
@@ -1143,13 +1326,6 @@ class LatencyApp(app_manager.RyuApp):
         # os.rename(f'{base_net_name}.state2', f'{base_net_name}.state')
 
 
-def portno_from_list(l):
-    return UsageStore(dict([
-        (tuple(x[:2]), i+1)
-        for i, x in l
-    ]))
-
-
 def usage_store_from_list(l):
     return UsageStore(dict([
         (tuple(x[:2]), 0)
@@ -1175,7 +1351,7 @@ def bandwidth_from_list(l):
 
 class PairSorterMixin:
     def _sort_pair(self, a, b):
-        return _sort_pair(a, b)
+        return interned_pair(a, b)
 
 
 class UsageStore(PairSorterMixin):
@@ -1208,14 +1384,20 @@ class UsageStore(PairSorterMixin):
     def __setitem__(self, idx, val: float):
         self._pairs[self._sort_pair(*idx)] = val
 
+    def discard(self, idx):
+        self._pairs.pop(self._sort_pair(*idx), None)
+
     def __str__(self):
         return repr(self)
 
     def __repr__(self):
         return f"{type(self).__name__}({repr(self._pairs)})"
 
+    # keys are sorted already
     def copy(self):
-        return type(self)(self._pairs.copy(), self._default)
+        copied = type(self)(default=self._default)
+        copied._pairs = self._pairs.copy()
+        return copied
 
     def to_regular_storage(self):
         return self.copy()
@@ -1225,6 +1407,71 @@ class UsageStore(PairSorterMixin):
         return self.to_regular_storage()
 
 
+# UsageStore over the topology's links, as a flat list indexed by link id
+# (None where unset), so reads skip sorting the endpoints. Pairs that
+# aren't links are kept in a regular store.
+class LinkUsageStore(UsageStore):
+    def __init__(self, initial=dict(), default=0):
+        self._values = [None]*len(topology.link_keys)
+        self._others = UsageStore()
+        for k, v in initial.items():
+            self[k] = v
+        self._default = default
+
+    @classmethod
+    def from_values(cls, values, default=0):
+        store = cls(default=default)
+        store._values = list(values)
+        return store
+
+    def __getitem__(self, idx) -> float:
+        link = topology.link_ids.get(idx)
+        if link is None:
+            return self._others._pairs.get(self._sort_pair(*idx), self._default)
+        value = self._values[link]
+        if value is None:
+            return self._default
+        return value
+
+    def contains(self, idx) -> bool:
+        link = topology.link_ids.get(idx)
+        if link is None:
+            return self._others.contains(idx)
+        return self._values[link] is not None
+
+    def __setitem__(self, idx, val: float):
+        link = topology.link_ids.get(idx)
+        if link is None:
+            self._others[idx] = val
+        else:
+            self._values[link] = val
+
+    def discard(self, idx):
+        link = topology.link_ids.get(idx)
+        if link is None:
+            self._others.discard(idx)
+        else:
+            self._values[link] = None
+
+    @property
+    def _pairs(self):
+        pairs = {
+            topology.link_keys[link]: value
+            for link, value in enumerate(self._values)
+            if value is not None
+        }
+        pairs.update(self._others._pairs)
+        return pairs
+
+    def copy(self):
+        copied = type(self).from_values(self._values, self._default)
+        copied._others = self._others.copy()
+        return copied
+
+    def to_regular_storage(self):
+        return UsageStore(self._pairs, self._default)
+
+
 class ValueGetterCallable:
     def __init__(self, value):
         self._val = value
@@ -1289,23 +1536,46 @@ class UsageStoreProxyFromCallableIterable(PairSorterMixin):
         return frz
 
 
+# Per-link aggregates of a switch's flow dict, kept materialized: a flow
+# changed through set_flow only marks its link dirty, and dirty links are
+# aggregated again on the next read. Whoever writes to the dict directly
+# must call invalidate().
 class UsageStoreProxyFromFlowDict(UsageStore):
     def __init__(self, dct, aggregator=sum):
         self._flows = dct
         self._agg = aggregator
+        self._default = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self._flows_by_link = None
+        self._aggregates = dict()
+        self._dirty = dict()
+
+    def _link_of(self, key):
+        return self._sort_pair(key[1], key[2])
+
+    def set_flow(self, key, value):
+        self._flows[key] = value
+        if self._flows_by_link is not None:
+            link = self._link_of(key)
+            self._flows_by_link.setdefault(link, dict())[key] = value
+            self._dirty[link] = None
 
     @property
     def _pairs(self):
-        d = dict()
-        l = [(self._sort_pair(k[1], k[2]), v) for k, v in self._flows.items()]
-        for k, _ in l:
-            if k not in d:
-                d[k] = list()
-        for k, v in l:
-            d[k].append(v)
-        for k in d.keys():
-            d[k] = self._agg(d[k])
-        return d
+        if self._flows_by_link is None:
+            self._flows_by_link = dict()
+            for key, value in self._flows.items():
+                self._flows_by_link.setdefault(self._link_of(key), dict())[key] = value
+            self._dirty = dict.fromkeys(self._flows_by_link.keys())
+        for link in self._dirty:
+            self._aggregates[link] = self._agg(list(self._flows_by_link[link].values()))
+        self._dirty = dict()
+        return self._aggregates
+
+    def __setitem__(self, idx, val: float):
+        raise TypeError(f"{type(self).__name__} is read-only, use set_flow")
 
     def to_regular_storage(self):
         return UsageStore(self._pairs)
@@ -1326,50 +1596,6 @@ class AttrCallableIterable:
         yield from EMPTY_ITER
 
 
-class DictAggregator:
-    def __init__(self, ds):
-        self._ds = ds
-
-    def __getitem__(self, q):
-        for d in self._ds:
-            if q in d:
-                return d[q]
-        return self._ds[q]
-
-    def get(self, q, e=None):
-        for d in self._ds:
-            if q in d:
-                return d[q]
-        return e
-
-    def keys(self):
-        return {
-            k
-            for d in self._ds
-            for k in d.keys()
-        }
-
-    def values(self):
-        return {
-            v
-            for d in self._ds
-            for v in d.values()
-        }
-
-    def items(self):
-        return {
-            i
-            for d in self._ds
-            for i in d.items()
-        }
-
-    def to_regular_dict(self):
-        return dict(self.items())
-
-    def copy(self):
-        return type(self)(self._ds.copy())
-
-
 class WeightedPathAggregate:
     def __init__(self, weighted: Dict[Tuple[str], float] = dict()):
         self._subscriptable = list(weighted.keys())[0]
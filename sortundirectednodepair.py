@@ -13,3 +13,14 @@ def _sort_pair(a: str, b: str) -> Tuple[str, str]:
         return b, a  # s7,s5 => s5,s7
     else:
         return a, b  # s5,s7 => s5,s7
+
+
+_sorted_pairs = dict()
+
+
+# _sort_pair, parsed once per ordered pair of names
+def interned_pair(a: str, b: str) -> Tuple[str, str]:
+    srtd = _sorted_pairs.get((a, b))
+    if srtd is None:
+        srtd = _sorted_pairs[(a, b)] = _sort_pair(a, b)
+    return srtd
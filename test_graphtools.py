@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import random
+from graphtools import AllPairsWidestPaths, CompactGraph, DynamicShortestPaths, _dijkstra, estimate_path_count, find_all_paths, sample_paths, widest_path
+from topostructure import GenericCandidates
+
+
+def topo(links):
+    nodes = sorted({node for link in links for node in link[:2]})
+    return (
+        [node for node in nodes if node.startswith('h')],
+        [node for node in nodes if node.startswith('s')],
+        [list(link) for link in links]
+    )
+
+
+# two hosts on opposite corners of a full mesh of switches
+def mesh(switches):
+    names = [f's{i+1}' for i in range(switches)]
+    links = [('h1', names[0], 1), ('h2', names[-1], 1)]
+    links += [(a, b, 1) for i, a in enumerate(names) for b in names[i+1:]]
+    return CompactGraph.from_topo(topo(links))
+
+
+def test_sample_paths_fills_k_or_exhausts():
+    graph = mesh(6)
+    for max_stretch in (1.5, 2.0, None):
+        true_count = len(list(find_all_paths(graph, 'h1', 'h2', max_stretch=max_stretch)))
+        for k in (1, 8, 32, true_count, true_count+10):
+            paths = list(sample_paths(graph, 'h1', 'h2', k, max_stretch, seed='h1>h2'))
+            assert len(paths) == min(k, true_count)
+            assert len(set(paths)) == len(paths)
+            assert all(path[0] == 'h1' and path[-1] == 'h2' for path in paths)
+            assert all(len(set(path)) == len(path) for path in paths)
+
+
+def test_candidates_over_budget_keep_max_paths():
+    graph = mesh(7)
+    budget = 100
+    assert estimate_path_count(graph, 'h1', 'h2', 2.0) > budget
+    true_count = len(list(find_all_paths(graph, 'h1', 'h2', max_stretch=2.0)))
+    paths = GenericCandidates(graph, path_budget=budget).paths('h1', 'h2', 32, 2.0)
+    assert len(paths) == min(32, true_count)
+    assert len(set(paths)) == len(paths)
+
+
+# the widest prefix h1-h3-h4-h2 doesn't widen the route past h2-h5
+def test_shortest_widest_takes_fewest_hops_at_the_best_width():
+    graph = CompactGraph.from_topo(topo([
+        ('h1', 'h2', 10), ('h2', 'h5', 10),
+        ('h1', 'h3', 100), ('h3', 'h4', 100), ('h4', 'h2', 100),
+    ]))
+    assert widest_path(graph, 'h5', 'h1', 'shortest-widest') == (['h5', 'h2', 'h1'], 10)
+    routes = AllPairsWidestPaths(graph, 'shortest-widest')
+    assert routes.path('h5', 'h1') == ['h5', 'h2', 'h1']
+    assert routes.distance('h5', 'h1') == 2
+    assert routes.width('h5', 'h1') == 10
+    assert routes.path('h2', 'h1') == ['h2', 'h4', 'h3', 'h1']
+    assert routes.next_hop('h5', 'h1') == 'h2'
+
+
+# whole-number costs keep every sum exact, whatever order it's taken in
+def test_dynamic_shortest_paths_match_dijkstra_after_updates():
+    rng = random.Random(7)
+    for trial in range(20):
+        n = rng.randint(4, 12)
+        names = [f's{i+1}' for i in range(n)]
+        links = {(rng.randrange(i), i) for i in range(1, n)}
+        for _ in range(rng.randint(0, 2*n)):
+            a, b = rng.sample(range(n), 2)
+            if (b, a) not in links:
+                links.add((a, b))
+        graph = CompactGraph.from_topo(topo([(names[a], names[b], 1) for a, b in links]))
+        weights = {link: float(rng.randint(1, 9)) for link in range(graph.link_count)}
+        paths = DynamicShortestPaths(graph, None, weights)
+        for batch in range(10):
+            changes = {
+                link: float(rng.randint(1, 9))
+                for link in rng.sample(range(graph.link_count), rng.randint(1, graph.link_count))
+            }
+            weights.update(changes)
+            paths.update(changes)
+            cost = lambda u, v, bandwidth: weights[graph.link_between(u, v)]
+            for source in names:
+                distance, _ = _dijkstra(graph, graph.index(source), cost)
+                for target in names:
+                    assert paths.distance(source, target) == distance[graph.index(target)]
+                    path = paths.path(source, target)
+                    assert path[0] == source and path[-1] == target
+                    assert sum([cost(u, v, None) for u, v in zip(path, path[1:])]) == distance[graph.index(target)]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+from graphtools import CompactGraph, k_shortest_paths
+from topoapa import ApaTable, PathIncidence, write_apa_cache
+
+
+# four hosts around a ring of switches with two chords
+def incidence(tmp_path):
+    switches = [f's{i+1}' for i in range(6)]
+    hosts = [f'h{i+1}' for i in range(4)]
+    links = [(switches[i], switches[(i+1) % 6], 1) for i in range(6)]
+    links += [('s1', 's4', 1), ('s2', 's5', 1)]
+    links += [(h, switches[i], 1) for i, h in enumerate(hosts)]
+    graph = CompactGraph.from_topo((hosts, switches, [list(link) for link in links]))
+    pop_apa = [
+        [tuple(k_shortest_paths(graph, h1, h2, 6, 2.0)) for h2 in hosts]
+        for h1 in hosts
+    ]
+    cache = str(tmp_path / 'ring.apa.bin')
+    write_apa_cache(cache, graph, hosts, pop_apa)
+    return len(hosts), graph.link_count, PathIncidence(ApaTable(cache))
+
+
+def test_pair_links_and_link_paths_round_trip(tmp_path):
+    host_count, link_count, paths = incidence(tmp_path)
+    crossings = 0
+    for i in range(host_count):
+        for j in range(i+1, host_count):
+            for p, path in enumerate(paths.pair_paths(i, j)):
+                assert paths.path_pair(path) == (i, j)
+                links = paths.pair_links(i, j)[p]
+                assert list(paths.pair_links(j, i)[p]) == list(reversed(links))
+                for link in links:
+                    assert path in paths.link_paths(link)
+                    assert (i, j) in paths.link_pairs(link)
+                crossings += len(links)
+    for link in range(link_count):
+        for path in paths.link_paths(link):
+            i, j = paths.path_pair(path)
+            assert link in paths.path_links(path)
+            assert path in paths.pair_paths(i, j)
+    assert crossings == sum([len(paths.link_paths(link)) for link in range(link_count)])
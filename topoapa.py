@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+from pathlib import Path
+from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from graphtools import CompactGraph
+from topostructure import candidate_generator, read_topo_meta
+from artifactcache import artifact_cache_from_config, cache_key
+
+APA_MAGIC = b'APA\x02'
+APA_HEADER = struct.Struct('=4s4xQQQQQQQ')
+
+_worker_candidates = None
+
+
+def jsonload_list2tuple(x):
+    if isinstance(x, type(None)) or isinstance(x, int) or isinstance(x, float) or isinstance(x, str):
+        return x
+    elif isinstance(x, list) or isinstance(x, tuple):
+        return tuple([jsonload_list2tuple(k) for k in x])
+    elif isinstance(x, dict):
+        return {jsonload_list2tuple(k): jsonload_list2tuple(v) for k, v in x.items()}
+    else:
+        raise ValueError("Input didn't come from a standard JSON")
+
+
+def read_apa_config(path='variables.ini'):
+    config = ConfigParser()
+    with open(path) as f:
+        config.read_string(f.read())
+    return config
+
+
+# optional; without it, every pair gets its k shortest paths
+def apa_path_budget(config):
+    budget = config['APA'].get('path_budget', '').strip()
+    if len(budget) <= 0:
+        return None
+    return int(budget)
+
+
+def _init_worker(candidates):
+    global _worker_candidates
+    _worker_candidates = candidates
+
+
+def _row_candidates(hosts, i, max_paths, max_stretch):
+    return i, [
+        (j, tuple(_worker_candidates.paths(
+            hosts[i], hosts[j], max_paths, max_stretch)))
+        for j in range(i+1, len(hosts))
+    ]
+
+
+def _read_partial(partfile, pop_apa):
+    done = 0
+    if partfile is None or not os.path.isfile(partfile):
+        return done
+    with open(partfile) as f:
+        lines = f.read().splitlines()
+    for n, line in enumerate(lines):
+        try:
+            i, j, apa = json.loads(line)
+        except ValueError:
+            # interrupted while writing the last line
+            with open(partfile, 'w') as f:
+                f.write(''.join([l+os.linesep for l in lines[:n]]))
+            break
+        apa = jsonload_list2tuple(apa)
+        pop_apa[i][j] = apa
+        pop_apa[j][i] = apa
+        done += 1
+    return done
+
+
+# Pairs are symmetric, so only the upper triangle is enumerated; each worker
+# takes one row of it. Finished pairs are appended to `cache`.part as they
+# arrive, so an interrupted run resumes where it stopped. Topologies with
+# generator metadata (see topostructure) only get their structural paths.
+def prepare_pop_pair_alternative_paths_for_availability(graph, hosts, max_paths=None, max_stretch=None, workers=None, cache=None, progress=None, meta=None, path_budget=None):
+    candidates = candidate_generator(graph, meta, path_budget)
+    hosts = list(hosts)
+    pop_apa = [[None for x in hosts] for y in hosts]
+    for i in range(len(hosts)):
+        pop_apa[i][i] = (tuple(),)
+    total = (len(hosts)*(len(hosts)-1))//2
+    partfile = None if cache is None else f'{cache}.part'
+    done = _read_partial(partfile, pop_apa)
+    pending = [
+        i for i in range(len(hosts))
+        if any(pop_apa[i][j] is None for j in range(i+1, len(hosts)))
+    ]
+    if progress is not None:
+        progress(done, total)
+    if len(pending) > 0:
+        part = None if partfile is None else open(partfile, 'a')
+        try:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(candidates,)) as executor:
+                futures = [
+                    executor.submit(_row_candidates, hosts,
+                                    i, max_paths, max_stretch)
+                    for i in pending
+                ]
+                for future in as_completed(futures):
+                    i, row = future.result()
+                    for j, apa in row:
+                        if pop_apa[i][j] is not None:
+                            continue
+                        pop_apa[i][j] = apa
+                        pop_apa[j][i] = apa
+                        done += 1
+                        if part is not None:
+                            part.write(json.dumps([i, j, apa])+os.linesep)
+                    if part is not None:
+                        part.flush()
+                    if progress is not None:
+                        progress(done, total)
+        finally:
+            if part is not None:
+                part.close()
+    if cache is not None:
+        write_apa_cache(cache, graph, hosts, pop_apa)
+        if os.path.isfile(partfile):
+            os.unlink(partfile)
+    return pop_apa
+
+
+def _pad8(n):
+    return (8 - n % 8) % 8
+
+
+def _pair_slot(i, j, host_count):
+    return i*host_count - (i*(i+1))//2 + (j-i-1)
+
+
+# Binary layout, native byte order, every section 8-byte aligned:
+#   header | node names ('\0'-separated) | host node ids (uint32) |
+#   link endpoints (uint32 pairs) | trie parents (int32) | trie refs (uint32) |
+#   pair offsets (uint64, upper triangle, into leaves) | leaves (uint32)
+# Node and link ids are the graph's. Each host i has one prefix trie holding
+# its paths towards every j > i, so paths leaving i share their common
+# prefixes. A trie entry refers to the link leading to it (the root, to the
+# host itself), and a path is stored as the entry of its last node.
+def write_apa_cache(cache, graph, hosts, pop_apa):
+    graph = CompactGraph.coerce(graph)
+    names = graph.names
+    endpoints = array('I')
+    for link in range(graph.link_count):
+        endpoints.extend(graph.link_nodes(link))
+    parents = array('i')
+    refs = array('I')
+    offsets = array('Q', [0])
+    leaves = array('I')
+    for i in range(len(hosts)):
+        children = dict()
+        for j in range(i+1, len(hosts)):
+            for path in pop_apa[i][j]:
+                current = -1
+                for k, node in enumerate(path):
+                    if current < 0:
+                        ref = graph.index(node)
+                    else:
+                        ref = graph.link_between(path[k-1], node)
+                    if (current, ref) not in children:
+                        children[(current, ref)] = len(refs)
+                        parents.append(current)
+                        refs.append(ref)
+                    current = children[(current, ref)]
+                leaves.append(current)
+            offsets.append(len(leaves))
+    names_blob = '\0'.join(names).encode('utf-8')
+    host_ids = array('I', [graph.index(h) for h in hosts])
+    tmp = f'{cache}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(APA_HEADER.pack(
+            APA_MAGIC,
+            len(names),
+            len(hosts),
+            len(names_blob),
+            graph.link_count,
+            len(refs),
+            len(offsets)-1,
+            len(leaves)
+        ))
+        for section in (names_blob, host_ids, endpoints, parents, refs, offsets, leaves):
+            section = bytes(section)
+            f.write(section)
+            f.write(bytes(_pad8(len(section))))
+    os.replace(tmp, cache)
+
+
+class ApaRow:
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, j):
+        return self._table.pair(self._i, j)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __iter__(self):
+        for j in range(len(self._table)):
+            yield self._table.pair(self._i, j)
+
+
+# Candidate paths from hosts[i] to hosts[j], read straight from the trie:
+# counting and link lists never build the node-name tuples
+class ApaPathSet:
+    def __init__(self, table, i, j):
+        self._table = table
+        self._i = i
+        self._j = j
+        self._leaves = table._pair_leaves(min(i, j), max(i, j))
+
+    def __reduce__(self):
+        return (ApaTable.pair, (self._table, self._i, self._j))
+
+    def __len__(self):
+        return len(self._leaves)
+
+    # link ids (CompactGraph / topology link indexes) along the k-th path,
+    # oriented from hosts[i] to hosts[j], and the host its trie is rooted at
+    def _walk(self, k):
+        parents = self._table._parents
+        refs = self._table._refs
+        links = list()
+        entry = self._leaves[k]
+        while parents[entry] >= 0:
+            links.append(refs[entry])
+            entry = parents[entry]
+        if self._i < self._j:
+            links.reverse()
+        return links, refs[entry]
+
+    def links(self, k):
+        return tuple(self._walk(k)[0])
+
+    def node_ids(self, k):
+        endpoints = self._table._endpoints
+        links, root = self._walk(k)
+        if self._i < self._j:
+            nodes = [root]
+        else:
+            nodes = [self._table._host_ids[self._i]]
+        for link in links:
+            u, v = endpoints[2*link], endpoints[2*link+1]
+            nodes.append(v if u == nodes[-1] else u)
+        return tuple(nodes)
+
+    def __getitem__(self, k):
+        names = self._table._names
+        return tuple(names[node] for node in self.node_ids(k))
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def link_lists(self):
+        return [self.links(k) for k in range(len(self))]
+
+
+# pop_apa[i][j] view over a memory-mapped cache; nothing is decoded until a
+# pair's paths are asked for, and both orientations share the i < j entry
+class ApaTable:
+    def __init__(self, cache):
+        self._cache = cache
+        with open(cache, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, node_count, host_count, names_len, link_count, trie_len, pair_count, leaves_len = APA_HEADER.unpack_from(
+            self._mm, 0)
+        if magic != APA_MAGIC:
+            raise ValueError(f"{cache} is not an APA cache")
+        view = memoryview(self._mm)
+        position = APA_HEADER.size
+
+        def section(length, itemsize, fmt):
+            nonlocal position
+            data = view[position:position+length*itemsize].cast(fmt)
+            position += length*itemsize+_pad8(length*itemsize)
+            return data
+        self._names = bytes(section(names_len, 1, 'B')).decode('utf-8').split('\0')
+        self._host_ids = section(host_count, 4, 'I')
+        self._endpoints = section(2*link_count, 4, 'I')
+        self._parents = section(trie_len, 4, 'i')
+        self._refs = section(trie_len, 4, 'I')
+        self._offsets = section(pair_count+1, 8, 'Q')
+        self._leaves = section(leaves_len, 4, 'I')
+        self._link_count = link_count
+        self._host_count = host_count
+
+    def __reduce__(self):
+        return (type(self), (self._cache,))
+
+    def __len__(self):
+        return self._host_count
+
+    def __getitem__(self, i):
+        return ApaRow(self, i)
+
+    @property
+    def hosts(self):
+        return tuple(self._names[h] for h in self._host_ids)
+
+    def _pair_leaves(self, i, j):
+        slot = _pair_slot(i, j, self._host_count)
+        return self._leaves[self._offsets[slot]:self._offsets[slot+1]]
+
+    def pair(self, i, j):
+        if i == j:
+            return (tuple(),)
+        return ApaPathSet(self, i, j)
+
+
+# Sparse incidence between candidate paths and links, both ways, in CSR
+# arrays. Path ids number the candidates pair by pair over the upper
+# triangle, in each pair's own order; links are graph link ids.
+class PathIncidence:
+    def __init__(self, apa_table):
+        host_count = len(apa_table)
+        link_count = apa_table._link_count
+        pair_offsets = array('Q', [0])
+        path_sources = array('I')
+        path_targets = array('I')
+        path_offsets = array('Q', [0])
+        path_links = array('I')
+        for i in range(host_count):
+            for j in range(i+1, host_count):
+                for links in apa_table.pair(i, j).link_lists():
+                    path_sources.append(i)
+                    path_targets.append(j)
+                    path_links.extend(links)
+                    path_offsets.append(len(path_links))
+                pair_offsets.append(len(path_sources))
+        link_offsets = array('Q', [0])*(link_count+1)
+        for link in path_links:
+            link_offsets[link+1] += 1
+        for link in range(link_count):
+            link_offsets[link+1] += link_offsets[link]
+        fill = array('Q', link_offsets[:-1])
+        link_paths = array('I', [0])*len(path_links)
+        for path in range(len(path_sources)):
+            for link in path_links[path_offsets[path]:path_offsets[path+1]]:
+                link_paths[fill[link]] = path
+                fill[link] += 1
+        self._host_count = host_count
+        self._pair_offsets = pair_offsets
+        self._path_sources = path_sources
+        self._path_targets = path_targets
+        self._path_offsets = path_offsets
+        self._path_links = path_links
+        self._link_offsets = link_offsets
+        self._link_paths = link_paths
+
+    def __len__(self):
+        return len(self._path_sources)
+
+    def pair_paths(self, i, j):
+        if i == j:
+            return range(0)
+        slot = _pair_slot(min(i, j), max(i, j), self._host_count)
+        return range(self._pair_offsets[slot], self._pair_offsets[slot+1])
+
+    def path_links(self, path):
+        return self._path_links[self._path_offsets[path]:self._path_offsets[path+1]]
+
+    # link lists of a pair's paths, oriented from hosts[i] to hosts[j]
+    def pair_links(self, i, j):
+        if i < j:
+            return [self.path_links(path) for path in self.pair_paths(i, j)]
+        return [self.path_links(path)[::-1] for path in self.pair_paths(i, j)]
+
+    # positions, within the pair, of its k most link-diverse paths: each
+    # round takes the path whose links the taken ones cross the least, the
+    # shorter on ties, so the shortest path comes first
+    def diverse_paths(self, i, j, k=None):
+        paths = self.pair_paths(i, j)
+        if k is None or len(paths) <= k:
+            return list(range(len(paths)))
+        links = [self.path_links(path) for path in paths]
+        used = dict()
+        remaining = list(range(len(paths)))
+        chosen = list()
+        while len(chosen) < k:
+            best = min(remaining, key=lambda p: (
+                sum([used.get(link, 0) for link in links[p]]),
+                len(links[p]),
+                p
+            ))
+            remaining.remove(best)
+            chosen.append(best)
+            for link in links[best]:
+                used[link] = used.get(link, 0)+1
+        return sorted(chosen)
+
+    def path_pair(self, path):
+        return self._path_sources[path], self._path_targets[path]
+
+    def link_paths(self, link):
+        return self._link_paths[self._link_offsets[link]:self._link_offsets[link+1]]
+
+    def link_pairs(self, link):
+        return {self.path_pair(path) for path in self.link_paths(link)}
+
+
+def read_apa_cache(cache):
+    return ApaTable(cache)
+
+
+def print_progress(done, total):
+    print(f"APA: {done}/{total} host pairs", file=sys.stderr)
+
+
+def cached_pop_apa(artifact_cache, network_topo, graph, max_paths, max_stretch, workers=None, progress=None, meta=None, path_budget=None):
+    return artifact_cache.get_or_build(
+        cache_key(network_topo, max_paths, max_stretch, meta, path_budget),
+        'apa.bin',
+        lambda path: prepare_pop_pair_alternative_paths_for_availability(
+            graph,
+            network_topo[0],
+            max_paths,
+            max_stretch,
+            workers,
+            path,
+            progress,
+            meta,
+            path_budget
+        ),
+        read_apa_cache
+    )
+
+
+def main(fn: str, workers=None):
+    topo = json.loads(Path(f'{fn}.json').read_text())
+    config = read_apa_config()
+    cached_pop_apa(
+        artifact_cache_from_config(config),
+        topo,
+        CompactGraph.from_topo(topo),
+        int(config['APA']['max_paths']),
+        float(config['APA']['path_stretch']),
+        workers,
+        print_progress,
+        read_topo_meta(fn),
+        apa_path_budget(config)
+    )
+
+
+if __name__ == "__main__":
+    prog, *modnames = sys.argv
+    workers = None
+    if len(modnames) > 0 and modnames[0].startswith('-j'):
+        workers = int(modnames[0][2:])
+        modnames = modnames[1:]
+    if len(modnames) > 0:
+        for modname in modnames:
+            print(f"Building APA for {modname}", file=sys.stderr)
+            main(modname, workers)
+    else:
+        print("Usage:", file=sys.stderr)
+        print(
+            f"  {sys.argv[0]} [-j<workers>] <toponame1> [<toponame2> [... [<toponameN>]]]", file=sys.stderr)
+        print(f"  <toponame>.json --> topocache/<hash>.apa.bin", file=sys.stderr)
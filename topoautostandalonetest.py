@@ -31,9 +31,6 @@ def run_many_tests(topo, module, results, test_count, returns_result=False):
     cfg = configparser.ConfigParser()
     cfg.read_string(CONTROLLER_VARIABLES.read_text())
     algo = cfg['GENERAL']['algo']
-    apacache = Path(f'{module.__name__}.apa.json')
-    if apacache.exists():
-        apacache.unlink()
     is_problematic = (algo, module.__name__) in PROBLEMATIC_SKIPS
     while len(sucessfulTests) < test_count:
         cachefile = cachedir.joinpath(
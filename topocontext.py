@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import sys
+import json
+from id2ip import id2ip
+from sortundirectednodepair import _sort_pair
+from graphtools import AllPairsShortestPaths, CompactGraph, all_pairs_routes
+from topoapa import PathIncidence, apa_path_budget, cached_pop_apa
+from topostructure import read_topo_meta
+from artifactcache import cache_key, pickled
+
+
+class PortMap:
+    def __init__(self, graph: CompactGraph, sw: str):
+        self._graph = graph
+        self._sw = sw
+
+    def __getitem__(self, idx) -> int:
+        link = self._graph.link_between(*idx)
+        if link is None:
+            return 0
+        return link+1
+
+    def reverse_lookup(self, val):
+        if not (0 < val <= self._graph.link_count):
+            return []
+        endpoints = self._graph.link_endpoints(val-1)
+        if self._sw not in endpoints:
+            return []
+        return [endpoints]
+
+
+# Host pairs grouped by the edge switches of their hosts: a host whose only
+# link goes to a switch shares all its candidates beyond that switch with
+# the other hosts there, so one representative pair stands for every pair
+# between two edge switches. Multi-homed hosts are a group on their own.
+class EdgeSwitchPairs:
+    def __init__(self, hosts, graph):
+        host_set = set(hosts)
+        self.edge_of = dict()
+        groups = dict()
+        for h in hosts:
+            neighbours = graph.adjacency[graph.index(h)]
+            edge = h
+            if len(neighbours) == 1 and graph.name(neighbours[0]) not in host_set:
+                edge = graph.name(neighbours[0])
+            self.edge_of[h] = edge
+            groups.setdefault(edge, list()).append(h)
+        self.groups = {edge: tuple(group) for edge, group in groups.items()}
+        self.members = dict()
+        edges = list(self.groups.keys())
+        for i, edge1 in enumerate(edges):
+            group1 = self.groups[edge1]
+            if len(group1) > 1:
+                self.members[group1[:2]] = tuple(
+                    (h1, h2)
+                    for j, h1 in enumerate(group1)
+                    for h2 in group1[j+1:]
+                )
+            for edge2 in edges[i+1:]:
+                group2 = self.groups[edge2]
+                self.members[(group1[0], group2[0])] = tuple(
+                    (h1, h2) for h1 in group1 for h2 in group2
+                )
+        self._representative = {
+            frozenset(pair): representative
+            for representative, pairs in self.members.items()
+            for pair in pairs
+        }
+
+    def __len__(self):
+        return len(self.members)
+
+    def representative(self, h1, h2):
+        return self._representative[frozenset((h1, h2))]
+
+    def is_representative(self, h1, h2):
+        return self.representative(h1, h2) in ((h1, h2), (h2, h1))
+
+    # the representative's path, moved onto each pair it stands for
+    def split(self, path):
+        representative = self.representative(path[0], path[-1])
+        for h1, h2 in self.members[representative]:
+            if path[0] != representative[0]:
+                h1, h2 = h2, h1
+            yield (h1, h2), (h1, *path[1:-1], h2)
+
+
+# Everything the controller and its evaluators derive from the topology,
+# built once at startup: name/index/IP lookups, per-switch links and ports,
+# the compact graph with link ids for either orientation of a link's
+# endpoints, hop-count shortest paths, the routes OSPF falls back
+# to ([OSPF] metric: hops or a bandwidth-aware one), the APA candidates,
+# of which the evaluators see the [APA] selected_paths most link-diverse
+# ones per pair, and the host pairs grouped by edge switch.
+# Port numbers are global link indexes + 1, as rendered by toporender.
+class TopologyContext:
+    def __init__(self, name, network_topo, graph, shortest_paths, apa, meta=None, ospf_routes=None, selected_paths=None):
+        hosts, switches, links = network_topo
+        self.name = name
+        self.hosts = tuple(hosts)
+        self.switches = tuple(switches)
+        self.links = tuple(tuple(link) for link in links)
+        self.host_index = {h: i for i, h in enumerate(self.hosts)}
+        self.switch_index = {sw: i for i, sw in enumerate(self.switches)}
+        self.host_ips = {h: id2ip(int(h[1:])-1) for h in self.hosts}
+        self.ip_hosts = {ip: h for h, ip in self.host_ips.items()}
+        self.switch_links = {sw: list() for sw in self.switches}
+        for i, link in enumerate(self.links):
+            for node in link[:2]:
+                if node in self.switch_links:
+                    self.switch_links[node].append((i, link))
+        self.ports = {sw: PortMap(graph, sw) for sw in self.switches}
+        self.graph = graph
+        self.shortest_paths = shortest_paths
+        self.ospf_routes = shortest_paths if ospf_routes is None else ospf_routes
+        self.apa = apa
+        self.incidence = PathIncidence(apa)
+        self.selected_paths = selected_paths
+        self._diverse = dict()
+        if selected_paths is not None:
+            for i in range(len(self.hosts)):
+                for j in range(i+1, len(self.hosts)):
+                    if len(self.incidence.pair_paths(i, j)) > selected_paths:
+                        self._diverse[(i, j)] = tuple(
+                            self.incidence.diverse_paths(i, j, selected_paths))
+        self.link_keys = tuple(
+            _sort_pair(*graph.link_endpoints(link))
+            for link in range(graph.link_count)
+        )
+        self.link_ids = {
+            endpoints: link
+            for link, (ne1, ne2) in enumerate(self.link_keys)
+            for endpoints in ((ne1, ne2), (ne2, ne1))
+        }
+        self.meta = meta
+        self.edge_pairs = EdgeSwitchPairs(self.hosts, graph)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"{type(self).__name__} is read-only")
+        super().__setattr__(name, value)
+
+    # (path, link ids) of the selected candidates, oriented from i to j;
+    # only the positions of the pairs over selected_paths are kept, as
+    # decoding happens here
+    def candidates(self, i, j):
+        paths = self.apa[i][j]
+        pair_paths = self.incidence.pair_paths(i, j)
+        selected = self._diverse.get((min(i, j), max(i, j)), range(len(pair_paths)))
+        return [
+            (paths[p], self.incidence.path_links(pair_paths[p])[::1 if i < j else -1])
+            for p in selected
+        ]
+
+    @property
+    def network_topo(self):
+        return self.hosts, self.switches, self.links
+
+    # ryu uses eventlet, which, on some versions, breaks pathlib's read_text
+    @classmethod
+    def load(cls, topo_file, network_config, artifact_cache, progress=None):
+        name = '.'.join(topo_file.split('.')[:-1])
+        with open(topo_file) as f:
+            network_topo = json.loads(f.read())
+        meta = read_topo_meta(name)
+        topology_key = cache_key(network_topo)
+        print(f"loading graph and shortest paths for {topo_file}", file=sys.stderr)
+        graph = artifact_cache.get_or_build(
+            topology_key,
+            'graph.pickle',
+            pickled(lambda: CompactGraph.from_topo(network_topo))
+        )
+        shortest_paths = artifact_cache.get_or_build(
+            topology_key,
+            'apsp.pickle',
+            pickled(lambda: AllPairsShortestPaths(graph))
+        )
+        ospf_metric = network_config.get('OSPF', 'metric', fallback='hops')
+        ospf_routes = shortest_paths
+        if ospf_metric != 'hops':
+            ospf_routes = artifact_cache.get_or_build(
+                topology_key,
+                f'ospf.{ospf_metric}.pickle',
+                pickled(lambda: all_pairs_routes(graph, ospf_metric))
+            )
+        print(f"loading APA for {topo_file}", file=sys.stderr)
+        apa = cached_pop_apa(
+            artifact_cache,
+            network_topo,
+            graph,
+            int(network_config['APA']['max_paths']),
+            float(network_config['APA']['path_stretch']),
+            progress=progress,
+            meta=meta,
+            path_budget=apa_path_budget(network_config)
+        )
+        selected_paths = network_config.get('APA', 'selected_paths', fallback='').strip()
+        return cls(
+            name, network_topo, graph, shortest_paths, apa, meta, ospf_routes,
+            int(selected_paths) if len(selected_paths) > 0 else None
+        )
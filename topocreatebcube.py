@@ -53,11 +53,21 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    return {
+        'family': 'bcube',
+        'servers': {h: [i % PODS, i // PODS] for i, h in enumerate(hosts)},
+        'levels': {**{s: 0 for s in switches[:PODS]}, **{s: 1 for s in switches[PODS:]}}
+    }
+
+
 def main(fn: str = 'bcube'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
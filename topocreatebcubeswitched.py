@@ -70,11 +70,26 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    servers = dict()
+    levels = dict()
+    for pod in range(PODS):
+        sw, *pod_servers = switches[(PODS+1)*pod:(PODS+1)*(pod+1)]
+        levels[sw] = 0
+        for i, server in enumerate(pod_servers):
+            servers[server] = [i, pod]
+    for sw in switches[(PODS+1)*PODS:]:
+        levels[sw] = 1
+    return {'family': 'bcube', 'servers': servers, 'levels': levels}
+
+
 def main(fn: str = 'bcubeswitched'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
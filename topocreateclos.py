@@ -51,11 +51,22 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    leafs = switches[:LEAF_COUNT]
+    spines = switches[LEAF_COUNT:]
+    return {
+        'family': 'tiered',
+        'layers': {**{s: 1 for s in leafs}, **{s: 2 for s in spines}}
+    }
+
+
 def main(fn: str = 'clos'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
@@ -56,11 +56,23 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    layers = dict()
+    first = 0
+    for layer, count in enumerate(k, 1):
+        for sw in switches[first:first+count]:
+            layers[sw] = layer
+        first += count
+    return {'family': 'tiered', 'layers': layers}
+
+
 def main(fn: str = 'clos5'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
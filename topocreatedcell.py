@@ -76,11 +76,20 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    return {
+        'family': 'dcell',
+        'cells': [[sw, *hosts[HPC*i:HPC*(i+1)]] for i, sw in enumerate(switches)]
+    }
+
+
 def main(fn: str = 'dcell'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
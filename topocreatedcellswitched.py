@@ -93,11 +93,20 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    return {
+        'family': 'dcell',
+        'cells': [switches[(HPC+1)*i:(HPC+1)*(i+1)] for i in range(CELLS)]
+    }
+
+
 def main(fn: str = 'dcellswitched'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
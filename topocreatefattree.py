@@ -67,11 +67,26 @@ def create_topo():
     return this_hosts, this_switches, this_links
 
 
+def create_meta(topo):
+    hosts, switches, links = topo
+    layers = dict()
+    for pod in range(PODS):
+        pod_sws = switches[2*LEAFS*pod:2*LEAFS*(pod+1)]
+        for sw in pod_sws[LEAFS:]:
+            layers[sw] = 1
+        for sw in pod_sws[:LEAFS]:
+            layers[sw] = 2
+    for sw in switches[2*LEAFS*PODS:]:
+        layers[sw] = 3
+    return {'family': 'tiered', 'layers': layers}
+
+
 def main(fn: str = 'fattree'):
     reset_iters()
     topo = create_topo()
     reset_iters()
     Path(f'{fn}.json').write_text(json.dumps(topo))
+    Path(f'{fn}.meta.json').write_text(json.dumps(create_meta(topo)))
     renderer(fn)
 
 
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+
+import os
+import json
+import itertools
+from abc import ABC, abstractmethod
+from collections import deque
+from graphtools import CompactGraph, _max_hops_for_stretch, estimate_path_count, k_shortest_paths, sample_paths
+
+# cells a DCell route may relay through between its source and target cells
+MAX_RELAY_CELLS = 2
+
+
+def read_topo_meta(fn):
+    path = f'{fn}.meta.json'
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.loads(f.read())
+
+
+def _is_simple(path):
+    return len(set(path)) == len(path)
+
+
+# any topology: Yen's k shortest simple paths within the stretch bound or,
+# for pairs with more than path_budget of them (estimated), a diverse
+# sample of max_paths, seeded by the pair so the result is reproducible
+class GenericCandidates:
+    def __init__(self, graph, meta=None, path_budget=None):
+        self._graph = CompactGraph.coerce(graph)
+        self._path_budget = path_budget
+
+    def paths(self, initial, target, max_paths=None, max_stretch=None):
+        if (
+            self._path_budget is not None
+            and max_paths is not None
+            and estimate_path_count(self._graph, initial, target, max_stretch) > self._path_budget
+        ):
+            return list(sample_paths(self._graph, initial, target, max_paths, max_stretch, seed=f'{initial}>{target}'))
+        return list(k_shortest_paths(self._graph, initial, target, max_paths, max_stretch))
+
+
+# Families known from generator metadata: _structured yields the valid node
+# paths between two nodes, which are ranked like the generic enumeration;
+# pairs the structure doesn't cover fall back to it.
+class _StructuredCandidates(GenericCandidates, ABC):
+    def paths(self, initial, target, max_paths=None, max_stretch=None):
+        if initial == target:
+            return [tuple([])]
+        cg = self._graph
+        found = sorted(
+            {path for path in self._structured(cg.index(initial), cg.index(target))
+             if _is_simple(path)},
+            key=lambda path: (len(path), path)
+        )
+        if len(found) <= 0:
+            return super().paths(initial, target, max_paths, max_stretch)
+        max_hops = _max_hops_for_stretch(len(found[0])-1, max_stretch)
+        if max_hops is not None:
+            found = [path for path in found if len(path)-1 <= max_hops]
+        names = cg.names
+        return [tuple(names[node] for node in path) for path in found[:max_paths]]
+
+    @abstractmethod
+    def _structured(self, initial, target):
+        pass
+
+    # endpoints outside the structure hang off one (or more) nodes inside it
+    def _attachments(self, node, inside):
+        if node in inside:
+            return [(tuple(), node)]
+        return [((node,), nxt) for nxt in self._graph.adjacency[node] if nxt in inside]
+
+    def _attached(self, initial, target, inside, inner_paths):
+        for head, first in self._attachments(initial, inside):
+            for tail, last in self._attachments(target, inside):
+                for path in inner_paths(first, last):
+                    yield head+path+tail
+
+
+# Clos, multi-stage Clos and fat-trees: switches carry a layer and valid
+# routes are valley-free, going monotonically up to one turning switch and
+# then monotonically down (or down then up, for hosts on the top stage).
+class TieredCandidates(_StructuredCandidates):
+    def __init__(self, graph, meta, path_budget=None):
+        super().__init__(graph, meta, path_budget)
+        cg = self._graph
+        self._layer = {cg.index(sw): layer for sw, layer in meta['layers'].items()}
+        self._cones = dict()
+
+    # monotone paths starting at node, as each reached switch's predecessors
+    def _cone(self, node, upwards):
+        if (node, upwards) not in self._cones:
+            layer = self._layer
+            adjacency = self._graph.adjacency
+            cone = {node: list()}
+            queue = deque([node])
+            while len(queue) > 0:
+                current = queue.popleft()
+                for nxt in adjacency[current]:
+                    if nxt not in layer:
+                        continue
+                    if (layer[nxt] > layer[current]) != upwards or layer[nxt] == layer[current]:
+                        continue
+                    if nxt not in cone:
+                        cone[nxt] = list()
+                        queue.append(nxt)
+                    cone[nxt].append(current)
+            self._cones[(node, upwards)] = cone
+        return self._cones[(node, upwards)]
+
+    def _cone_paths(self, cone, node):
+        if len(cone[node]) <= 0:
+            yield (node,)
+        for previous in cone[node]:
+            for path in self._cone_paths(cone, previous):
+                yield path+(node,)
+
+    def _turning(self, first, last):
+        for upwards in (True, False):
+            cone_first = self._cone(first, upwards)
+            cone_last = self._cone(last, upwards)
+            for turn in cone_first.keys() & cone_last.keys():
+                for rise in self._cone_paths(cone_first, turn):
+                    for fall in self._cone_paths(cone_last, turn):
+                        yield rise+tuple(reversed(fall[:-1]))
+
+    def _structured(self, initial, target):
+        return self._attached(initial, target, self._layer, self._turning)
+
+
+# BCube: servers have one digit per level and a level-l switch joins the
+# servers differing only on digit l. Valid routes correct the differing
+# digits in any order, optionally detouring one digit through another value
+# first and fixing it last, which is what BCube's parallel paths do.
+class BCubeCandidates(_StructuredCandidates):
+    def __init__(self, graph, meta, path_budget=None):
+        super().__init__(graph, meta, path_budget)
+        cg = self._graph
+        self._address = {cg.index(server): tuple(address)
+                         for server, address in meta['servers'].items()}
+        self._server_at = {address: server for server, address in self._address.items()}
+        levels = {cg.index(sw): level for sw, level in meta['levels'].items()}
+        self._switch_of = {
+            (server, levels[sw]): sw
+            for server in self._address
+            for sw in cg.adjacency[server]
+            if sw in levels
+        }
+        self._level_count = max([len(address) for address in self._address.values()], default=0)
+        self._digits = [
+            sorted({address[level] for address in self._address.values()})
+            for level in range(self._level_count)
+        ]
+
+    def _corrections(self, source, destination):
+        differing = [level for level in range(self._level_count)
+                     if source[level] != destination[level]]
+        for order in itertools.permutations(differing):
+            yield [(level, destination[level]) for level in order]
+        for detour in range(self._level_count):
+            others = [level for level in differing if level != detour]
+            for digit in self._digits[detour]:
+                if digit in (source[detour], destination[detour]):
+                    continue
+                for order in itertools.permutations(others):
+                    yield [(detour, digit)] + \
+                        [(level, destination[level]) for level in order] + \
+                        [(detour, destination[detour])]
+
+    def _corrected(self, first, last):
+        for corrections in self._corrections(self._address[first], self._address[last]):
+            current = first
+            path = [first]
+            for level, digit in corrections:
+                address = list(self._address[current])
+                address[level] = digit
+                nxt = self._server_at.get(tuple(address))
+                sw = self._switch_of.get((current, level))
+                if nxt is None or sw is None or self._switch_of.get((nxt, level)) != sw:
+                    break
+                path += [sw, nxt]
+                current = nxt
+            else:
+                yield tuple(path)
+
+    def _structured(self, initial, target):
+        return self._attached(initial, target, self._address, self._corrected)
+
+
+# DCell: servers are grouped in cells routed internally, and cells are
+# joined by direct server-to-server links. Valid routes visit a simple
+# sequence of cells, relaying through at most MAX_RELAY_CELLS other ones.
+class DCellCandidates(_StructuredCandidates):
+    def __init__(self, graph, meta, path_budget=None):
+        super().__init__(graph, meta, path_budget)
+        cg = self._graph
+        self._cells = [frozenset(cg.index(node) for node in cell) for cell in meta['cells']]
+        self._cell_of = {node: c for c, cell in enumerate(self._cells) for node in cell}
+        self._bridges = dict()
+        for node, c in self._cell_of.items():
+            for nxt in cg.adjacency[node]:
+                if nxt in self._cell_of and self._cell_of[nxt] != c:
+                    self._bridges.setdefault((c, self._cell_of[nxt]), list()).append((node, nxt))
+        self._inside = dict()
+
+    # shortest path between two nodes of a cell, without leaving it
+    def _within(self, first, last):
+        if (first, last) not in self._inside:
+            cell = self._cells[self._cell_of[first]]
+            adjacency = self._graph.adjacency
+            previous = {first: None}
+            queue = deque([first])
+            while len(queue) > 0 and last not in previous:
+                current = queue.popleft()
+                for nxt in adjacency[current]:
+                    if nxt in cell and nxt not in previous:
+                        previous[nxt] = current
+                        queue.append(nxt)
+            path = None
+            if last in previous:
+                path = [last]
+                while previous[path[-1]] is not None:
+                    path.append(previous[path[-1]])
+                path = tuple(reversed(path))
+            self._inside[(first, last)] = path
+        return self._inside[(first, last)]
+
+    def _cell_sequences(self, source, destination):
+        others = [c for c in range(len(self._cells)) if c not in (source, destination)]
+        for relays in range(MAX_RELAY_CELLS+1):
+            if source == destination and relays == 1:
+                continue
+            for middle in itertools.permutations(others, relays):
+                if source == destination and relays == 0:
+                    yield (source,)
+                else:
+                    yield (source, *middle, destination)
+
+    def _crossed(self, first, last):
+        for cells in self._cell_sequences(self._cell_of[first], self._cell_of[last]):
+            crossings = [self._bridges.get(hop, list()) for hop in zip(cells, cells[1:])]
+            for bridges in itertools.product(*crossings):
+                current = first
+                path = (first,)
+                for leaving, entry in bridges+((last, None),):
+                    inside = self._within(current, leaving)
+                    if inside is None:
+                        break
+                    path += inside[1:]
+                    if entry is not None:
+                        path += (entry,)
+                        current = entry
+                else:
+                    yield path
+
+    def _structured(self, initial, target):
+        return self._attached(initial, target, self._cell_of, self._crossed)
+
+
+CANDIDATE_GENERATORS = {
+    'tiered': TieredCandidates,
+    'bcube': BCubeCandidates,
+    'dcell': DCellCandidates,
+}
+
+
+def candidate_generator(graph, meta=None, path_budget=None):
+    if meta is None or meta.get('family') not in CANDIDATE_GENERATORS:
+        return GenericCandidates(graph, meta, path_budget)
+    return CANDIDATE_GENERATORS[meta['family']](graph, meta, path_budget)
@@ -9,7 +9,8 @@ import networkx
 import traceback
 import threading
 from pathlib import Path
-from graphtools import Dijkstra, graph_from_topo
+from configparser import ConfigParser
+from graphtools import CompactGraph, all_pairs_routes
 from sortundirectednodepair import _sort_pair
 from networkx.drawing.layout import spring_layout
 from networkx.drawing.nx_pylab import draw_networkx
@@ -66,6 +67,13 @@ def parse_state(s):
     return pathb, path_segments, loads
 
 
+# the reference routes drawn are the ones the OSPF fallback would install
+def get_ospf_metric():
+    config = ConfigParser()
+    config.read('variables.ini')
+    return config.get('OSPF', 'metric', fallback='hops')
+
+
 def get_loaded_switches():
     pt = Path("~current.sws.state")
     if not pt.exists():
@@ -99,7 +107,7 @@ def plot(ax, currentfile):
         topoPos[toponame] = spring_layout(nxg, iterations=2000)
     pos = topoPos[toponame]
     if toponame not in topoDjkt:
-        djkt = Dijkstra(graph_from_topo(topo))
+        djkt = all_pairs_routes(CompactGraph.from_topo(topo), get_ospf_metric())
         djkt_pairs = list()
         for h1 in topo[0]:
             for h2 in topo[0]: